@@ -0,0 +1,125 @@
+"""
+Decode time and peak memory of the upload preprocessing: the original full
+decode + cv2.resize against the reduced-resolution decode path.
+
+Usage:
+    python -m benchmarks.decode_benchmark [IMAGE ...] [--repeat 20] [--output results.json]
+
+Without images, synthetic JPEGs of common phone camera sizes and one PNG
+are generated. Every measurement runs in a fresh process so the peak RSS
+of one path does not hide the other.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.images import synthetic_image
+from src.services.preprocessing import IMAGE_SIZE, decode_image_uint8
+
+SYNTHETIC_SIZES = [(640, 480), (1920, 1080), (4032, 3024), (8000, 6000)]
+
+
+def full_decode(img_bytes: bytes) -> np.ndarray:
+    img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.resize(img, IMAGE_SIZE)
+
+
+PATHS = {"full": full_decode, "reduced": decode_image_uint8}
+
+
+def synthetic_images() -> dict[str, bytes]:
+    images = {}
+    for seed, (width, height) in enumerate(SYNTHETIC_SIZES):
+        images[f"{width}x{height}.jpg"] = synthetic_image(width, height, seed)
+        if (width, height) == (1920, 1080):
+            images[f"{width}x{height}.png"] = synthetic_image(width, height, seed, ext=".png")
+    return images
+
+
+def measure_time(path: str, img_bytes: bytes, repeat: int, queue):
+    decode = PATHS[path]
+    decode(img_bytes)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decode(img_bytes)
+        timings.append((time.perf_counter() - started) * 1000)
+    queue.put({"median_ms": statistics.median(timings), "min_ms": min(timings)})
+
+
+def peak_rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak_rss():
+    # A spawned child inherits the parent's max RSS; Linux lets us reset it
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def measure_peak(path: str, img_bytes: bytes, queue):
+    # Growth of the peak RSS over a single decode in a fresh process
+    reset_peak_rss()
+    before_kb = peak_rss_kb()
+    PATHS[path](img_bytes)
+    queue.put((peak_rss_kb() - before_kb) / 1024)
+
+
+def run_isolated(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.images:
+        images = {}
+        for path in args.images:
+            with open(path, "rb") as f:
+                images[path] = f.read()
+    else:
+        images = synthetic_images()
+
+    results = []
+    print(f"{'image':<24} {'path':<8} {'median, ms':>11} {'min, ms':>9} {'decode peak, MB':>16}")
+    for name, img_bytes in images.items():
+        for path in PATHS:
+            row = run_isolated(measure_time, path, img_bytes, args.repeat)
+            row["decode_peak_mb"] = run_isolated(measure_peak, path, img_bytes)
+            row.update({"image": name, "path": path, "bytes": len(img_bytes)})
+            results.append(row)
+            print(f"{name:<24} {path:<8} {row['median_ms']:>11.2f} {row['min_ms']:>9.2f} {row['decode_peak_mb']:>16.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
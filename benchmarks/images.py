@@ -0,0 +1,15 @@
+"""
+Synthetic test images shared by the benchmarks.
+"""
+import cv2
+import numpy as np
+
+
+def synthetic_image(width: int, height: int, seed: int, ext: str = ".jpg") -> bytes:
+    # Smooth gradients with noise compress like photos, unlike pure noise
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    img = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    img = np.clip(img + rng.integers(-20, 20, img.shape), 0, 255).astype(np.uint8)
+    params = [cv2.IMWRITE_JPEG_QUALITY, 90] if ext == ".jpg" else []
+    return cv2.imencode(ext, img, params)[1].tobytes()
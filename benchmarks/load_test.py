@@ -0,0 +1,252 @@
+"""
+Load test of the serving stack: starts main:app with uvicorn (or targets a
+running server), replays uploads of several image sizes at several
+concurrency levels and reports requests per second and latency percentiles.
+
+Usage:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --sizes 640x480,4032x3024 --concurrency 1,16,64 --requests 500
+    python -m benchmarks.load_test --env INFERENCE_EXECUTOR=process --env INFERENCE_WORKERS=4
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --compare benchmarks/results/<previous>.json
+
+Every request carries unique bytes appended after the end of the image, so
+the prediction cache never answers instead of the model; --allow-cache-hits
+replays identical files. Results are written as JSON to benchmarks/results/
+(named by time and git commit) for comparison between commits. A started
+server runs in a temporary directory, so its uploads, processed images,
+thumbnails, upload index, prediction history and log are deleted afterwards.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+from benchmarks.images import synthetic_image
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ENDPOINTS = ["/upload/", "/api/predict"]
+# Written by the server relative to its working directory
+SERVER_OUTPUTS = {"upload_images", "processed_images", "processed_store", "thumbnails", "upload_index.jsonl",
+                  "prediction_history.db", "test.log"}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return float(np.percentile(sorted_values, q))
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_workdir(directory: str):
+    """
+    Link the repository into directory, except what the server writes, so
+    relative paths (templates, .env, model files) resolve as in the repo.
+    """
+    for name in os.listdir(REPO_DIR):
+        if name not in SERVER_OUTPUTS:
+            os.symlink(os.path.join(REPO_DIR, name), os.path.join(directory, name))
+
+
+def start_server(port: int, env_overrides: dict[str, str], timeout: float, workdir: str):
+    env = {**os.environ, **env_overrides}
+    server_workdir(workdir)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env,
+        cwd=workdir,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{url}/readyz", timeout=1).status_code == 200:
+                return process, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"Server was not ready after {timeout:.0f}s")
+
+
+class Scenario:
+    def __init__(self, url: str, endpoint: str, image: bytes, size: str, unique: bool):
+        self.url = url + endpoint
+        self.endpoint = endpoint
+        self.image = image
+        self.size = size
+        self.unique = unique
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def request(self) -> tuple[float, int]:
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        content = self.image + f"bench-{time.time_ns()}-{number}".encode() if self.unique else self.image
+        started = time.perf_counter()
+        try:
+            response = self._session().post(
+                self.url, files={"file": (f"bench_{self.size}_{number}.jpg", content, "image/jpeg")}, timeout=120
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        return time.perf_counter() - started, status
+
+    def run(self, concurrency: int, total: int, warmup: int) -> dict:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda _: self.request(), range(warmup)))
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: self.request(), range(total)))
+            elapsed = time.perf_counter() - started
+        latencies = sorted(seconds * 1000 for seconds, status in results if status == 200)
+        statuses = {}
+        for _, status in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            "endpoint": self.endpoint,
+            "image_size": self.size,
+            "image_bytes": len(self.image),
+            "concurrency": concurrency,
+            "requests": total,
+            "ok": len(latencies),
+            "statuses": statuses,
+            "duration_s": elapsed,
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "latency_ms_mean": statistics.fmean(latencies) if latencies else 0.0,
+            "latency_ms_p50": percentile(latencies, 50),
+            "latency_ms_p95": percentile(latencies, 95),
+            "latency_ms_p99": percentile(latencies, 99),
+        }
+
+
+def scenario_key(row: dict) -> tuple:
+    return row["endpoint"], row["image_size"], row["concurrency"]
+
+
+def print_comparison(results: list[dict], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {scenario_key(row): row for row in json.load(f)["scenarios"]}
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'endpoint':<14} {'size':<11} {'conc':>5} {'rps':>10} {'p50':>10} {'p99':>10}")
+    for row in results:
+        old = baseline.get(scenario_key(row))
+        if old is None:
+            continue
+
+        def change(key):
+            return f"{(row[key] / old[key] - 1) * 100:+.1f}%" if old[key] else "n/a"
+
+        print(f"{row['endpoint']:<14} {row['image_size']:<11} {row['concurrency']:>5} "
+              f"{change('rps'):>10} {change('latency_ms_p50'):>10} {change('latency_ms_p99'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Target a running server instead of starting one")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Settings for the started server, e.g. INFERENCE_WORKERS=4")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--sizes", default="32x32,640x480,1920x1080,4032x3024")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario")
+    parser.add_argument("--allow-cache-hits", action="store_true")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", default=None, help=f"Default: {RESULTS_DIR}/<time>_<commit>.json")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare with")
+    args = parser.parse_args()
+
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes.split(",")]
+    images = {f"{w}x{h}": synthetic_image(w, h, seed=i) for i, (w, h) in enumerate(sizes)}
+
+    started_at = datetime.now(timezone.utc)
+    process = None
+    workdir = None
+    url = args.url
+    if url is None:
+        workdir = tempfile.TemporaryDirectory(prefix="load_test_")
+        try:
+            process, url = start_server(free_port(), env_overrides, args.startup_timeout, workdir.name)
+        except BaseException:
+            workdir.cleanup()
+            raise
+    results = []
+    try:
+        print(f"{'endpoint':<14} {'size':<11} {'conc':>5} {'ok':>6} {'rps':>8} "
+              f"{'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9}")
+        for endpoint in args.endpoints.split(","):
+            for size, image in images.items():
+                for concurrency in (int(c) for c in args.concurrency.split(",")):
+                    scenario = Scenario(url, endpoint, image, size, unique=not args.allow_cache_hits)
+                    row = scenario.run(concurrency, args.requests, args.warmup)
+                    results.append(row)
+                    print(f"{endpoint:<14} {size:<11} {concurrency:>5} {row['ok']:>6} {row['rps']:>8.1f} "
+                          f"{row['latency_ms_p50']:>9.1f} {row['latency_ms_p95']:>9.1f} {row['latency_ms_p99']:>9.1f}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if workdir is not None:
+            workdir.cleanup()
+
+    commit = git_commit()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{started_at:%Y%m%dT%H%M%S}_{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "started_at": started_at.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "server_env": env_overrides if args.url is None else None,
+            "allow_cache_hits": args.allow_cache_hits,
+            "scenarios": results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,296 @@
-from fastapi import FastAPI, File, UploadFile, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.templating import Jinja2Templates
-import shutil
+import asyncio
+import cv2
+import hmac
 import os
 import logging
-import tensorflow as tf
+import time
+from datetime import datetime, timezone
 import numpy as np
-from PIL import Image  
-import cv2
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Annotated, Literal
+
+from src.conf import messages
+from src.conf.config import config
+from src.services import inference, metrics
+from src.services.cascade import ModelCascade
+from src.services.ensemble import ModelEnsemble
+from src.services.http_cache import cached_bytes_response, cached_file_response
+from src.services.executor import InferenceExecutor, InferenceQueueFull
+from src.services.model_registry import ModelLoadFailed, ModelRegistry
+from src.services.prediction_cache import PredictionCache
+from src.services.prediction_history import PredictionHistory
+from src.services.processed_store import ProcessedImageStore
+from src.services.thumbnails import ensure_thumbnail
+from src.services.upload_index import UploadIndex
+from src.services.uploads import (ReceivedFile, UploadRejected, is_zip_upload, read_zip_images,
+                                  receive_batch_upload, receive_image_upload)
+from src.schemas.images import UploadedImagePageSchema
+from src.schemas.models import CandidateModelSchema, DefaultModelSchema, ModelLoadSchema
+from src.repositories.predictions import PredictionRepo
+from src.schemas.predictions import (BatchPredictionResponseSchema, PredictionHistoryPageSchema,
+                                     PredictionResponseSchema)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor.start()
+    processed_store.start()
+    if config.PREDICTION_HISTORY_DB_URL:
+        try:
+            await prediction_history.start()
+        except Exception as e:
+            logger.error(f"Prediction history is not available: {e}")
+    # Моделі завантажуються у фоні, щоб сервер одразу почав приймати з'єднання
+    warmup = asyncio.create_task(load_and_warm_up_models())
+    yield
+    warmup.cancel()
+    await registry.stop()
+    await processed_store.stop()
+    await prediction_history.stop()
+    upload_index.close()
+    executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 templates = Jinja2Templates(directory="src/templates")
 
 UPLOAD_FOLDER = "upload_images"
 PROCESSED_FOLDER = "processed_images"
+PROCESSED_STORE_FOLDER = "processed_store"
+THUMBNAIL_FOLDER = "thumbnails"
+# Поза UPLOAD_FOLDER, щоб завантажений файл не міг його перезаписати
+UPLOAD_INDEX_PATH = "upload_index.jsonl"
 
 # Створення папок, якщо вони не існують
-for folder in [UPLOAD_FOLDER, PROCESSED_FOLDER]:
+for folder in [UPLOAD_FOLDER, PROCESSED_FOLDER, PROCESSED_STORE_FOLDER, THUMBNAIL_FOLDER]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
-# Шлях до моделі
-model_path = "CNN_50_epochs.h5"
+# Оброблені зображення 32x32 дописуються пакетами в один масив у PROCESSED_STORE_FOLDER
+# замість окремого PNG на кожне завантаження. У PROCESSED_FOLDER лишаються тільки старі PNG,
+# які віддаються як файли, тому файли сховища там зберігатися не можуть
+processed_store = ProcessedImageStore(PROCESSED_STORE_FOLDER)
+
+# Індекс завантажень для галереї: список у пам'яті, що зберігається у файлі UPLOAD_INDEX_PATH
+upload_index = UploadIndex(UPLOAD_FOLDER, persist_path=UPLOAD_INDEX_PATH)
+
+# Історія прогнозів: буферизований запис пакетами в SQLite або Postgres
+prediction_history = PredictionHistory(
+    config.PREDICTION_HISTORY_DB_URL,
+    max_batch_size=config.PREDICTION_HISTORY_BATCH_SIZE,
+    flush_interval_ms=config.PREDICTION_HISTORY_FLUSH_MS,
+)
+HISTORY_TOP_K = 3
 
 # Налаштування логування
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Перевірка наявності файлу моделі
-if not tf.io.gfile.exists(model_path):
-    logger.error(f"Model file not found at {model_path}")
-else:
-    model = tf.keras.models.load_model(model_path)
-    logger.info(f"Model loaded successfully from {model_path}")
+# Стан моделі для /readyz
+model_status = {"ready": False, "error": None}
 
 # Класи CIFAR-10
-classes = ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
+classes = inference.CLASSES
+
+# Окремий пул для декодування, прогнозування та збереження, щоб не блокувати event loop.
+# У режимі "process" кожен воркер тримає власні копії моделей
+executor = InferenceExecutor(
+    config.INFERENCE_EXECUTOR,
+    workers=config.INFERENCE_WORKERS,
+    queue_size=config.INFERENCE_QUEUE_SIZE,
+)
+
+# Реєстр моделей: у кожної моделі свій мікробатчер (keras або tflite бекенд)
+# і кеш прогнозів за хешем вмісту файлу
+registry = ModelRegistry(
+    executor,
+    backend=config.INFERENCE_BACKEND,
+    quantization=config.TFLITE_QUANTIZATION,
+    num_threads=config.TFLITE_NUM_THREADS,
+    warmup_batch_sizes=config.WARMUP_BATCH_SIZES,
+    max_batch_size=config.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=config.INFERENCE_MAX_WAIT_MS,
+    cache_size=config.PREDICTION_CACHE_SIZE,
+    cache_dir=config.PREDICTION_CACHE_DIR,
+    cache_disk_items=config.PREDICTION_CACHE_DISK_ITEMS,
+)
+
+# Каскад: швидка модель відповідає сама, важка отримує лише невпевнені зображення
+cascade = ModelCascade(
+    registry,
+    fast=config.CASCADE_FAST_MODEL,
+    heavy=config.CASCADE_HEAVY_MODEL,
+    min_probability=config.CASCADE_MIN_PROBABILITY,
+    min_margin=config.CASCADE_MIN_MARGIN,
+)
+
+# Ансамбль: зважене середнє ймовірностей кількох моделей на одному вході
+ensemble = ModelEnsemble(registry, config.ENSEMBLE_WEIGHTS)
+
+# Метрики Prometheus: гістограми записуються в гарячому шляху, датчики читаються під час збору
+metrics.registry.register(metrics.Gauge(
+    "inference_in_flight_requests", "Requests admitted to the inference executor", lambda: executor.in_flight))
+metrics.registry.register(metrics.Gauge(
+    "inference_queue_depth", "Items waiting in background queues",
+    lambda: {
+        **{("batcher", name): entry.batcher.queue_depth for name, entry in registry.models.items()},
+        ("processed_store", ""): processed_store.queue_depth,
+        ("prediction_history", ""): prediction_history.queue_depth,
+    },
+    ("queue", "model"),
+))
+metrics.registry.register(metrics.Gauge(
+    "process_resident_memory_bytes", "Resident memory of the server process", metrics.resident_memory_bytes))
+
+async def load_and_warm_up_models():
+    started = time.perf_counter()
+    try:
+        for name, spec in config.MODELS.items():
+            await registry.load(name, spec.path, spec.preprocessing)
+        if config.DEFAULT_MODEL not in registry.models:
+            raise ValueError(f"Default model {config.DEFAULT_MODEL} is not in MODELS")
+        registry.set_default(config.DEFAULT_MODEL)
+        if config.CANDIDATE_MODEL:
+            registry.set_candidate(config.CANDIDATE_MODEL, config.CANDIDATE_TRAFFIC_SHARE)
+        if config.SERVING_MODE == "cascade":
+            for name in (cascade.fast, cascade.heavy):
+                if name not in registry.models:
+                    raise ValueError(f"Cascade model {name} is not in MODELS")
+        if config.SERVING_MODE == "ensemble":
+            for name in ensemble.weights:
+                if name not in registry.models:
+                    raise ValueError(f"Ensemble model {name} is not in MODELS")
+    except FileNotFoundError as e:
+        model_status["error"] = str(e)
+        logger.error(model_status["error"])
+        return
+    except Exception as e:
+        model_status["error"] = f"Model loading failed: {e!r}"
+        logger.error(model_status["error"])
+        return
+    model_status["ready"] = True
+    logger.info(f"{len(config.MODELS)} model(s) loaded and warmed up in {time.perf_counter() - started:.1f}s")
+
+def get_model(name: str | None):
+    """
+    Pin the requested model, or the default/candidate one, for the rest of the request.
+    """
+    ensure_model_exists(name)
+    return registry.use(name)
+
+def ensure_model_exists(name: str | None):
+    if name is not None and name not in registry.models:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MODEL_NOT_FOUND)
+
+def ensure_model_ready():
+    if not model_status["ready"]:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=messages.MODEL_NOT_READY)
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    if model_status["ready"]:
+        return {"status": "ready"}
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "error" if model_status["error"] else "loading", "detail": model_status["error"]},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/upload/", response_class=HTMLResponse)
-async def upload_image(request: Request, file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    processed_file_path = os.path.join(PROCESSED_FOLDER, file.filename)
+# Схема тіла запиту для документації: файл читається вручну з потоку запиту
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+@app.post("/upload/", response_class=HTMLResponse, openapi_extra=UPLOAD_OPENAPI)
+async def upload_image(request: Request):
+    ensure_model_ready()
+    try:
+        with executor.admit():
+            return await process_upload(request)
+    except InferenceQueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=messages.INFERENCE_QUEUE_FULL)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+async def classify_image(img_bytes, cache_key: str, model: str | None = None, filename: str | None = None):
+    """
+    Returns the name of the model that answered, class probabilities and the decoded
+    model input (None on a cache hit). Without an explicit model the SERVING_MODE applies.
+    """
+    started = time.perf_counter()
+    # Повторне завантаження того ж файлу не потребує декодування та прогнозування:
+    # кожна модель має власний кеш прогнозів
+    if model is None and config.SERVING_MODE == "cascade":
+        model_name, predictions, img = await cascade.classify(img_bytes, cache_key)
+    elif model is None and config.SERVING_MODE == "ensemble":
+        model_name, predictions, img = await ensemble.classify(img_bytes, cache_key)
+    else:
+        with get_model(model) as entry:
+            predictions, img = await registry.classify(entry, img_bytes, cache_key)
+        model_name = entry.name
+    # Запис в історію лише ставить рядок у чергу, запит не чекає на базу даних
+    top_k = inference.top_k(predictions, classes, HISTORY_TOP_K)
+    metrics.PREDICTIONS.labels(model_name, top_k[0]["label"]).inc()
+    prediction_history.record(cache_key, filename, model_name, top_k, (time.perf_counter() - started) * 1000)
+    return model_name, predictions, img
+
+async def read_upload(request: Request, folder: str | None, endpoint: str):
+    started = time.perf_counter()
+    upload = await receive_image_upload(request, "file", folder, config.MAX_FILE_SIZE_BYTES, config.TYPES_IMAGES)
+    metrics.UPLOAD_READ_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+    return upload
+
+async def process_upload(request: Request):
+    # Один прохід по тілу запиту: запис на диск, хеш і буфер для декодування одночасно,
+    # з відмовою одразу після перевищення розміру або невідповідного формату
+    upload = await read_upload(request, UPLOAD_FOLDER, "/upload/")
+    upload_index.add(upload.filename, len(upload.content))
 
-    # Зчитування та обробка зображення за допомогою OpenCV та numpy
-    file.file.seek(0)  # Повернення до початку файлу
-    img_bytes = await file.read()
-    nparr = np.frombuffer(img_bytes, np.uint8)
-    
     try:
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        img = cv2.resize(img, (32, 32))
-        img = img.astype('float32') / 255.0
-        img = np.expand_dims(img, axis=0)
-
-        # Прогнозування
-        predictions = model.predict(img)
-        logger.info(f"Predictions: {predictions}")
+        model_name, predictions, img = await classify_image(upload.content, upload.sha256, filename=upload.filename)
+        logger.debug("Predictions: %s", predictions)
         predicted_class_index = np.argmax(predictions)
+        # Збереження обробленого зображення у фоні; при попаданні в кеш
+        # нове ім'я посилається на вже збережений вміст
+        if img is not None:
+            processed_store.put(upload.filename, upload.sha256, img, int(predicted_class_index))
+        else:
+            processed_store.link(upload.filename, upload.sha256)
         predicted_class = classes[predicted_class_index]
-        probability = predictions[0][predicted_class_index]
-        logger.info(f"Predicted class: {predicted_class} with probability {probability}")
-
-        # Збереження обробленого зображення
-        processed_img = Image.fromarray((img[0] * 255).astype(np.uint8))
-        processed_img.save(processed_file_path)
+        probability = predictions[predicted_class_index]
+        logger.info(f"Predicted class: {predicted_class} with probability {probability} ({model_name})")
 
         # Створення словника з ймовірностями для кожного класу
-        probabilities = {classes[i]: float(predictions[0][i]) for i in range(len(classes))}
+        probabilities = {classes[i]: float(predictions[i]) for i in range(len(classes))}
 
         return templates.TemplateResponse("success.html", {
             "request": request, 
-            "filename": file.filename, 
+            "filename": upload.filename, 
             "predicted_class": predicted_class, 
             "probability": probability, 
             "probabilities": probabilities
@@ -87,22 +299,322 @@ async def upload_image(request: Request, file: UploadFile = File(...)):
         logger.error(f"Error processing image: {e}")
         return templates.TemplateResponse("error.html", {"request": request, "message": "Error processing image"})
 
+@app.post("/api/predict", response_model=PredictionResponseSchema, response_model_exclude_none=True,
+          openapi_extra=UPLOAD_OPENAPI)
+async def predict_image(
+        request: Request,
+        top_k: Annotated[int, Query(description="Number of most probable classes", ge=1, le=10)] = 3,
+        include_probabilities: Annotated[bool, Query(description="Add probabilities of all classes")] = False,
+        model: Annotated[str | None, Query(description="Model name, SERVING_MODE applies if omitted")] = None,
+):
+    """
+    Classify one image and return JSON. Nothing is written to disk and no template is rendered.
+    """
+    ensure_model_ready()
+    ensure_model_exists(model)
+    try:
+        with executor.admit():
+            upload = await read_upload(request, None, "/api/predict")
+            model_name, predictions, _ = await classify_image(upload.content, upload.sha256, model)
+    except InferenceQueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=messages.INFERENCE_QUEUE_FULL)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=messages.COULD_NOT_DECODE_IMAGE)
+
+    response = {"model": model_name, "top_k": inference.top_k(predictions, classes, top_k)}
+    if include_probabilities:
+        response["probabilities"] = {label: float(p) for label, p in zip(classes, predictions)}
+    return response
+
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            "required": ["files"],
+        }}},
+    }
+}
+
+@app.post("/api/predict/batch", response_model=BatchPredictionResponseSchema, response_model_exclude_none=True,
+          openapi_extra=BATCH_UPLOAD_OPENAPI)
+async def predict_images_batch(
+        request: Request,
+        top_k: Annotated[int, Query(description="Number of most probable classes per file", ge=1, le=10)] = 3,
+        model: Annotated[str | None, Query(description="Model name, SERVING_MODE applies if omitted")] = None,
+):
+    """
+    Classify many images in one request. Accepts several files and/or zip archives with images.
+    Files are decoded in parallel and classified in batches of INFERENCE_MAX_BATCH_SIZE.
+    In cascade mode the uncertain files go to the heavy model after the fast pass, and every
+    result names the model that answered it.
+    """
+    ensure_model_ready()
+    ensure_model_exists(model)
+    try:
+        with executor.admit():
+            # Тіло читається потоком з лімітами на кількість і розмір файлів
+            files = await receive_batch_upload(request, "files", config.BATCH_PREDICT_MAX_FILES,
+                                               config.MAX_FILE_SIZE_BYTES, config.BATCH_PREDICT_MAX_TOTAL_BYTES)
+            return await classify_files(files, top_k, model)
+    except InferenceQueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=messages.INFERENCE_QUEUE_FULL)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+async def classify_files(files: list[ReceivedFile], k: int, model: str | None):
+    # (ім'я, вміст, помилка): пошкоджені файли в архіві отримують помилку, а не 500 на весь запит
+    items = []
+    # Ліміти перевіряються до розпакування: кількість файлів і сумарний розмір після розпакування
+    remaining_bytes = config.BATCH_PREDICT_MAX_TOTAL_BYTES
+    for file in files:
+        if is_zip_upload(file.filename, file.content_type):
+            members = await run_in_threadpool(
+                read_zip_images, file.content, config.BATCH_PREDICT_MAX_FILES - len(items),
+                config.MAX_FILE_SIZE_BYTES, remaining_bytes,
+            )
+        else:
+            members = [(file.filename, file.content, None)]
+            if len(items) >= config.BATCH_PREDICT_MAX_FILES:
+                raise UploadRejected(messages.TOO_MANY_FILES)
+            if len(file.content) > remaining_bytes:
+                raise UploadRejected(messages.BATCH_TOO_LARGE, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        remaining_bytes -= sum(len(content) for _, content, _ in members)
+        items.extend(members)
+
+    readable = [i for i, (_, _, error) in enumerate(items) if error is None]
+    contents = [items[i][1] for i in readable]
+    keys = await run_in_threadpool(lambda: [PredictionCache.content_hash(content) for content in contents])
+
+    # Файли декодуються паралельно, кожен не більше одного разу на запит, і прогнозуються
+    # батчами; кеш прогнозів кожної моделі перевіряється першим
+    decoded = {}
+    file_models = [None] * len(readable)
+    if model is None and config.SERVING_MODE == "cascade":
+        model_name = cascade.name
+        file_models, rows = await cascade.classify_many(contents, keys, decoded)
+    elif model is None and config.SERVING_MODE == "ensemble":
+        model_name = ensemble.name
+        rows = await ensemble.classify_many(contents, keys, decoded)
+    else:
+        with get_model(model) as entry:
+            rows = await registry.classify_many(entry, contents, keys, decoded)
+        model_name = entry.name
+
+    results = [{"filename": filename, "error": error} for filename, _, error in items]
+    for i, row, file_model in zip(readable, rows, file_models):
+        if row is None:
+            results[i]["error"] = messages.COULD_NOT_DECODE_IMAGE
+            continue
+        results[i] = {"filename": items[i][0], "model": file_model, "top_k": inference.top_k(row, classes, k)}
+        metrics.PREDICTIONS.labels(file_model or model_name, results[i]["top_k"][0]["label"]).inc()
+    return {"model": model_name, "results": results}
+
 @app.get("/image/{filename}", response_class=HTMLResponse)
 async def show_image(request: Request, filename):
     return templates.TemplateResponse("image.html", {"request": request, "filename": filename})
 
+def uploaded_file_path(filename: str) -> str:
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    if filename.startswith(".") or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMAGE_NOT_FOUND)
+    return path
+
 @app.get("/get_image/{filename}")
-async def get_image(filename):
-    return FileResponse(os.path.join(UPLOAD_FOLDER, filename))
+async def get_image(request: Request, filename):
+    # ETag і Cache-Control: браузер і CDN перевіряють актуальність замість повторного завантаження
+    return cached_file_response(request, uploaded_file_path(filename), config.IMAGE_CACHE_CONTROL)
+
+@app.get("/thumbnail/{size}/{filename}")
+async def get_thumbnail(request: Request, size: int, filename: str):
+    """
+    JPEG preview no larger than size x size; size must be one of THUMBNAIL_SIZES.
+    Created on first request and cached on disk.
+    """
+    if size not in config.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMAGE_NOT_FOUND)
+    source_path = uploaded_file_path(filename)
+    try:
+        path = await run_in_threadpool(ensure_thumbnail, source_path, THUMBNAIL_FOLDER, size, filename)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=messages.COULD_NOT_DECODE_IMAGE)
+    return cached_file_response(request, path, config.IMAGE_CACHE_CONTROL, media_type="image/jpeg")
+
+LEGACY_PROCESSED_EXTENSIONS = (".png", ".jpg", ".jpeg")
 
 @app.get("/get_processed_image/{filename}")
-async def get_processed_image(filename):
-    return FileResponse(os.path.join(PROCESSED_FOLDER, filename))
+async def get_processed_image(request: Request, filename):
+    img = processed_store.get(filename)
+    if img is None:
+        # Зображення, збережені до появи сховища, лежать окремими PNG
+        path = os.path.join(PROCESSED_FOLDER, filename)
+        if (not filename.startswith(".") and filename.lower().endswith(LEGACY_PROCESSED_EXTENSIONS)
+                and os.path.isfile(path)):
+            return cached_file_response(request, path, config.IMAGE_CACHE_CONTROL)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMAGE_NOT_FOUND)
+    return cached_bytes_response(
+        request, cv2.imencode(".png", img)[1].tobytes(), "image/png", config.IMAGE_CACHE_CONTROL
+    )
+
+@app.get("/prediction_cache/stats")
+async def prediction_cache_stats():
+    return {name: entry.cache.stats() for name, entry in registry.models.items()}
+
+@app.get("/models")
+async def list_models():
+    """
+    Loaded models, the traffic split and per-model request counters and latency percentiles.
+    """
+    return registry.describe()
+
+admin_bearer = HTTPBearer(auto_error=False)
+MODEL_EXTENSIONS = (".h5", ".keras")
+
+def require_model_admin(credentials: HTTPAuthorizationCredentials | None = Depends(admin_bearer)):
+    """
+    Endpoints that change what the server runs need the MODEL_ADMIN_TOKEN bearer token.
+    """
+    if not config.MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=messages.MODEL_ADMIN_DISABLED)
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(),
+                                                      config.MODEL_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.NOT_AUTHENTICATED,
+                            headers={"WWW-Authenticate": "Bearer"})
+
+def model_file_path(path: str) -> str:
+    """
+    Resolve a model path relative to MODEL_DIR. Files outside it, in the folders
+    clients upload to, or of other types are refused.
+    """
+    model_dir = os.path.realpath(config.MODEL_DIR)
+    resolved = os.path.realpath(os.path.join(model_dir, path))
+    client_folders = [os.path.realpath(folder) for folder in
+                      (UPLOAD_FOLDER, PROCESSED_FOLDER, PROCESSED_STORE_FOLDER, THUMBNAIL_FOLDER)]
+    if (os.path.commonpath([resolved, model_dir]) != model_dir
+            or any(os.path.commonpath([resolved, folder]) == folder for folder in client_folders)
+            or not resolved.endswith(MODEL_EXTENSIONS)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.MODEL_PATH_NOT_ALLOWED)
+    return resolved
+
+@app.post("/models", dependencies=[Depends(require_model_admin)])
+async def load_model(body: ModelLoadSchema):
+    """
+    Load a model (or reload an existing name) and warm it up without interrupting traffic.
+    Requests already using the previous version of the model finish on it.
+    """
+    try:
+        await registry.load(body.name, model_file_path(body.path), body.preprocessing)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MODEL_FILE_NOT_FOUND)
+    except ModelLoadFailed as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=messages.MODEL_LOAD_FAILED)
+    return registry.describe()
+
+@app.get("/models/cascade")
+async def cascade_stats():
+    """
+    Cascade thresholds, escalation rate and end-to-end latency percentiles.
+    """
+    return {"enabled": config.SERVING_MODE == "cascade", **cascade.describe()}
+
+@app.get("/models/ensemble")
+async def ensemble_stats():
+    """
+    Ensemble weights, end-to-end latency and per-model agreement with the ensemble answer and latency.
+    """
+    return {"enabled": config.SERVING_MODE == "ensemble", **ensemble.describe()}
+
+@app.put("/models/default", dependencies=[Depends(require_model_admin)])
+async def set_default_model(body: DefaultModelSchema):
+    try:
+        registry.set_default(body.name)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MODEL_NOT_FOUND)
+    return registry.describe()
+
+@app.put("/models/candidate", dependencies=[Depends(require_model_admin)])
+async def set_candidate_model(body: CandidateModelSchema):
+    """
+    Route a share of traffic to a candidate model; name=null stops the split.
+    """
+    try:
+        registry.set_candidate(body.name, body.share)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MODEL_NOT_FOUND)
+    return registry.describe()
+
+@app.get("/predictions/history", response_model=PredictionHistoryPageSchema)
+async def prediction_history_page(
+        label: Annotated[str | None, Query(description="Predicted class")] = None,
+        since: Annotated[datetime | None, Query(description="From this time (UTC), inclusive")] = None,
+        until: Annotated[datetime | None, Query(description="Until this time (UTC), exclusive")] = None,
+        min_probability: Annotated[float | None, Query(ge=0, le=1)] = None,
+        max_probability: Annotated[float | None, Query(ge=0, le=1)] = None,
+        cursor: Annotated[str | None, Query(description="next_cursor of the previous page")] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+):
+    """
+    Recorded predictions, newest first. Rows become visible after the next history flush.
+    """
+    if not prediction_history.engine:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.PREDICTION_HISTORY_DISABLED)
+    if label is not None and label not in classes:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=messages.UNKNOWN_CLASS)
+    # Час в історії зберігається як UTC без часового поясу
+    since, until = (
+        value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo else value
+        for value in (since, until)
+    )
+    before = None
+    if cursor is not None:
+        try:
+            created_at, row_id = cursor.rsplit("_", 1)
+            before = (datetime.fromisoformat(created_at), int(row_id))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=messages.INVALID_CURSOR)
+    async with prediction_history.session() as session:
+        rows = await PredictionRepo(session).find(
+            label, since, until, min_probability, max_probability, before, limit
+        )
+    next_cursor = f"{rows[-1].created_at.isoformat()}_{rows[-1].id}" if len(rows) == limit else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+@app.get("/predictions/history/stats")
+async def prediction_history_stats():
+    return prediction_history.stats()
 
 @app.get("/all_images", response_class=HTMLResponse)
-async def show_all_images(request: Request):
-    images = os.listdir(UPLOAD_FOLDER)
-    return templates.TemplateResponse("all_images.html", {"request": request, "images": images})
+async def show_all_images(
+        request: Request,
+        cursor: Annotated[int | None, Query(ge=0)] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        order: Literal["newest", "oldest"] = "newest",
+):
+    records, next_cursor = upload_index.page(cursor, limit, newest_first=order == "newest")
+    return templates.TemplateResponse("all_images.html", {
+        "request": request,
+        "images": [record.filename for record in records],
+        "next_cursor": next_cursor,
+        "limit": limit,
+        "order": order,
+        "thumbnail_size": max(config.THUMBNAIL_SIZES),
+    })
+
+@app.get("/api/images", response_model=UploadedImagePageSchema)
+async def list_images(
+        cursor: Annotated[int | None, Query(ge=0, description="next_cursor of the previous page")] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        order: Literal["newest", "oldest"] = "newest",
+):
+    """
+    Uploaded images sorted by upload time, one page at a time.
+    """
+    records, next_cursor = upload_index.page(cursor, limit, newest_first=order == "newest")
+    return {"items": [asdict(record) for record in records], "next_cursor": next_cursor}
 
 if __name__ == "__main__":
     import uvicorn
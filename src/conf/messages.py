@@ -18,4 +18,27 @@ PASSWORD_RESET_REQUEST_SENT = "Password reset request sent"
 
 NOT_AUTHENTICATED = "Not authenticated"
 EMAIL_IS_ALREADY_BUSY = 'This email is already busy'
-USERNAME_IS_ALREADY_BUSY = 'This username is already busy'
\ No newline at end of file
+USERNAME_IS_ALREADY_BUSY = 'This username is already busy'
+
+INFERENCE_QUEUE_FULL = "Server is busy, try again later"
+MODEL_NOT_READY = "Model is loading, try again later"
+TOO_MANY_FILES = "Too many files in one request"
+BATCH_TOO_LARGE = "Files in one request are too large in total"
+COULD_NOT_DECODE_IMAGE = "Could not decode image"
+INVALID_ZIP_ARCHIVE = "Invalid zip archive"
+CORRUPTED_ZIP_MEMBER = "File in the zip archive is corrupted"
+UNSUPPORTED_ZIP_MEMBER = "File in the zip archive is encrypted or uses an unsupported compression method"
+NO_FILE_UPLOADED = "No image file in the request"
+INVALID_FILENAME = "Invalid file name"
+FILE_TOO_LARGE = "File is too large"
+UNSUPPORTED_IMAGE_TYPE = "Only PNG and JPEG images are supported"
+INVALID_MULTIPART_BODY = "Invalid multipart body"
+MODEL_NOT_FOUND = "Model not found"
+MODEL_FILE_NOT_FOUND = "Model file not found"
+MODEL_LOAD_FAILED = "Model file could not be loaded"
+MODEL_ADMIN_DISABLED = "Model administration is disabled"
+MODEL_PATH_NOT_ALLOWED = "Model path must be a .h5 or .keras file inside the model directory"
+IMAGE_NOT_FOUND = "Image not found"
+PREDICTION_HISTORY_DISABLED = "Prediction history is disabled"
+INVALID_CURSOR = "Invalid cursor"
+UNKNOWN_CLASS = "Unknown class"
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Float, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.base import Base
+
+
+class PredictionModel(Base):
+    __tablename__ = "predictions"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=True)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    predicted_class: Mapped[str] = mapped_column(String(32), nullable=False)
+    probability: Mapped[float] = mapped_column(Float, nullable=False)
+    top_k: Mapped[list] = mapped_column(JSON, nullable=False)
+    latency_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    created_at: Mapped[datetime] = mapped_column("created_at", DateTime, nullable=False)
+
+    __table_args__ = (
+        # History is queried by class and time range, or by time range alone
+        Index("ix_predictions_class_created_at", "predicted_class", "created_at"),
+        Index("ix_predictions_created_at", "created_at"),
+    )
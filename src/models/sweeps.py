@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Float, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.base import Base
+
+
+class SweepTrialModel(Base):
+    __tablename__ = "sweep_trials"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sweep: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Sorted JSON of the hyperparameters, identifies the trial within its sweep
+    params_key: Mapped[str] = mapped_column(String(512), nullable=False)
+    params: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # pending, running, complete, pruned or failed
+    status: Mapped[str] = mapped_column(String(16), nullable=False)
+    host: Mapped[str] = mapped_column(String(255), nullable=True)
+    threads: Mapped[int] = mapped_column(Integer, nullable=True)
+    inter_op_threads: Mapped[int] = mapped_column(Integer, nullable=True)
+    cores: Mapped[list] = mapped_column(JSON, nullable=True)
+    parameters: Mapped[int] = mapped_column(Integer, nullable=True)
+    epochs: Mapped[int] = mapped_column(Integer, nullable=True)
+    val_loss: Mapped[float] = mapped_column(Float, nullable=True)
+    val_accuracy: Mapped[float] = mapped_column(Float, nullable=True)
+    train_seconds: Mapped[float] = mapped_column(Float, nullable=True)
+    seconds_per_epoch: Mapped[float] = mapped_column(Float, nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    started_at: Mapped[datetime] = mapped_column("started_at", DateTime, nullable=True)
+    finished_at: Mapped[datetime] = mapped_column("finished_at", DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_sweep_trials_sweep_params_key", "sweep", "params_key", unique=True),
+    )
+
+
+class SweepEpochModel(Base):
+    __tablename__ = "sweep_epochs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    trial_id: Mapped[int] = mapped_column(Integer, ForeignKey("sweep_trials.id"), nullable=False)
+    epoch: Mapped[int] = mapped_column(Integer, nullable=False)
+    loss: Mapped[float] = mapped_column(Float, nullable=True)
+    accuracy: Mapped[float] = mapped_column(Float, nullable=True)
+    val_loss: Mapped[float] = mapped_column(Float, nullable=True)
+    val_accuracy: Mapped[float] = mapped_column(Float, nullable=True)
+    epoch_seconds: Mapped[float] = mapped_column(Float, nullable=True)
+
+    __table_args__ = (
+        # The stopping rule compares trials of a sweep at the same epoch
+        Index("ix_sweep_epochs_trial_epoch", "trial_id", "epoch"),
+    )
@@ -0,0 +1,86 @@
+"""
+Model architectures trained for the service, built from code instead of notebooks.
+"""
+import tensorflow as tf
+
+from src.services.preprocessing import IMAGE_SIZE
+
+NUM_CLASSES = 10
+
+# Layout of CNN_50.ipynb: three blocks of two 4x4 convolutions with batch
+# normalization, each block followed by 2x2 max pooling and dropout
+CNN50_CONV_FILTERS = (264, 128, 512, 128, 128, 128)
+CNN50_DENSE_UNITS = (1064, 512)
+CNN50_DROPOUT = (0.2, 0.25, 0.35, 0.5)
+
+
+def build_cnn(conv_filters: tuple[int, ...] = CNN50_CONV_FILTERS, dense_units: tuple[int, ...] = CNN50_DENSE_UNITS,
+              dropout: tuple[float, ...] = CNN50_DROPOUT, kernel_size: int = 4, name: str = "cnn50",
+              logits: bool = False) -> tf.keras.Model:
+    """
+    The CNN_50 network with configurable width, used as is for CNN_50_epochs.h5
+    and scaled down for students and sweeps.
+
+    :param conv_filters: tuple: Filters of each convolution, two per block
+    :param dense_units: tuple: Units of the hidden dense layers
+    :param dropout: tuple: Dropout after every block, then before the output layer
+    :param logits: bool: Leave out the softmax, for losses computed on logits
+    :return: Uncompiled model with an output per CIFAR-10 class
+    """
+    if len(conv_filters) % 2 or len(dropout) != len(conv_filters) // 2 + 1:
+        raise ValueError("Expected two convolutions per block and one dropout rate per block plus one")
+    layers = tf.keras.layers
+    model = tf.keras.Sequential(name=name)
+    model.add(layers.Input((*IMAGE_SIZE, 3)))
+    for block in range(len(conv_filters) // 2):
+        for filters in conv_filters[2 * block:2 * block + 2]:
+            model.add(layers.Conv2D(filters, (kernel_size, kernel_size), activation="relu", padding="same"))
+            model.add(layers.BatchNormalization())
+        model.add(layers.MaxPooling2D(pool_size=(2, 2)))
+        model.add(layers.Dropout(dropout[block]))
+    model.add(layers.Flatten())
+    for units in dense_units:
+        model.add(layers.Dense(units, activation="relu"))
+        model.add(layers.BatchNormalization())
+    model.add(layers.Dropout(dropout[-1]))
+    model.add(layers.Dense(NUM_CLASSES, activation=None if logits else "softmax"))
+    return model
+
+
+# Head of ResNet50.ipynb on top of the pooled backbone output
+RESNET50_HEAD_UNITS = (1024, 512)
+# CIFAR images are upsampled 7x to the 224x224 input ResNet50 was trained on
+RESNET50_UPSAMPLING = 7
+
+
+def build_resnet50_backbone(weights: str | None = "imagenet") -> tf.keras.Model:
+    """
+    Upsampling and ResNet50 up to global average pooling, as in ResNet50.ipynb.
+    Takes the output of keras.applications.resnet50.preprocess_input.
+
+    :param weights: str: "imagenet" or None for random initialization
+    :return: Model mapping (n, 32, 32, 3) inputs to (n, 2048) features
+    """
+    inputs = tf.keras.layers.Input((*IMAGE_SIZE, 3))
+    x = tf.keras.layers.UpSampling2D(size=(RESNET50_UPSAMPLING, RESNET50_UPSAMPLING))(inputs)
+    resnet = tf.keras.applications.ResNet50(input_shape=(IMAGE_SIZE[0] * RESNET50_UPSAMPLING,
+                                                         IMAGE_SIZE[1] * RESNET50_UPSAMPLING, 3),
+                                            include_top=False, weights=weights, pooling="avg")
+    return tf.keras.Model(inputs, resnet(x), name="resnet50_backbone")
+
+
+def build_resnet50_head(feature_size: int = 2048, units: tuple[int, ...] = RESNET50_HEAD_UNITS) -> tf.keras.Model:
+    inputs = tf.keras.layers.Input((feature_size,))
+    x = inputs
+    for width in units:
+        x = tf.keras.layers.Dense(width, activation="relu")(x)
+    outputs = tf.keras.layers.Dense(NUM_CLASSES, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs, name="resnet50_head")
+
+
+def assemble_resnet50(backbone: tf.keras.Model, head: tf.keras.Model) -> tf.keras.Model:
+    """
+    Backbone and trained head as one model, served with the "resnet50" input preprocessing.
+    """
+    inputs = tf.keras.layers.Input((*IMAGE_SIZE, 3))
+    return tf.keras.Model(inputs, head(backbone(inputs)), name="resnet50")
@@ -0,0 +1,236 @@
+"""
+Classify a large number of images offline with the model served by main.py.
+
+Usage:
+    python -m src.neural_network.bulk_classify upload_images/ --output results.csv
+    python -m src.neural_network.bulk_classify --file-list paths.txt --output results/ --format parquet
+
+Images are decoded and resized in a process pool with the same preprocessing
+as the upload endpoints, fed through a prefetching tf.data pipeline and
+classified in batches. Results are streamed to CSV (appended) or Parquet
+(one part file per flush in the output directory). Progress is stored in a
+checkpoint file after every flush; running the same command again resumes
+after the last flushed image. The checkpoint holds a fingerprint of the
+input list, so a resume with added or removed images is refused, and the
+output is cut back to the checkpoint first, so rows written after it are not
+duplicated.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from src.services.backends import BACKENDS, QUANTIZATIONS, load_backend
+from src.services.inference import CLASSES, INPUT_PREPROCESSING
+from src.services.preprocessing import IMAGE_SIZE, decode_image_uint8
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+COLUMNS = ["path", "label", "probability", "error"] + [f"p_{label}" for label in CLASSES]
+
+
+def collect_paths(inputs: list[str], file_list: str | None) -> list[str]:
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    if file_list:
+        with open(file_list) as f:
+            paths.extend(line.strip() for line in f if line.strip())
+    return paths
+
+
+def decode_file(path: str) -> tuple[str, np.ndarray, bool]:
+    try:
+        with open(path, "rb") as f:
+            return path, decode_image_uint8(f.read()), True
+    except Exception:
+        return path, np.zeros((*IMAGE_SIZE, 3), dtype=np.uint8), False
+
+
+def build_dataset(paths: list[str], pool, batch_size: int, chunksize: int):
+    import tensorflow as tf
+
+    def generate():
+        yield from pool.imap(decode_file, paths, chunksize=chunksize)
+
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec((), tf.string),
+        tf.TensorSpec((*IMAGE_SIZE, 3), tf.uint8),
+        tf.TensorSpec((), tf.bool),
+    ))
+    return (dataset
+            .batch(batch_size)
+            .map(lambda path, img, ok: (path, tf.cast(img, tf.float32) / 255.0, ok),
+                 num_parallel_calls=tf.data.AUTOTUNE)
+            .prefetch(tf.data.AUTOTUNE))
+
+
+def result_rows(paths, predictions: np.ndarray, ok) -> list[list]:
+    rows = []
+    for path, row, decoded in zip(paths, predictions, ok):
+        path = path.decode() if isinstance(path, bytes) else path
+        if not decoded:
+            rows.append([path, "", None, "decode_failed"] + [None] * len(CLASSES))
+            continue
+        index = int(np.argmax(row))
+        rows.append([path, CLASSES[index], float(row[index]), ""] + [float(p) for p in row])
+    return rows
+
+
+class CsvWriter:
+    """
+    :param position: int: Size of the file at the checkpoint, None to start a new file
+    """
+
+    def __init__(self, path: str, position: int | None):
+        if position is not None:
+            os.truncate(path, position)
+        self._file = open(path, "w" if position is None else "a", newline="")
+        self._writer = csv.writer(self._file)
+        if position is None:
+            self._writer.writerow(COLUMNS)
+
+    @property
+    def position(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def write(self, rows: list[list]):
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    :param position: int: Number of part files at the checkpoint, None to start anew
+    """
+
+    def __init__(self, directory: str, position: int | None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow") from e
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._part = position or 0
+        # Parts written after the checkpoint, or by an earlier run
+        for name in os.listdir(directory):
+            if (name.startswith("part-") and name.endswith(".parquet")
+                    and int(name[len("part-"):-len(".parquet")]) >= self._part):
+                os.remove(os.path.join(directory, name))
+
+    @property
+    def position(self) -> int:
+        return self._part
+
+    def write(self, rows: list[list]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)})
+        path = os.path.join(self.directory, f"part-{self._part:05d}.parquet")
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self._part += 1
+
+    def close(self):
+        pass
+
+
+def paths_fingerprint(paths: list[str]) -> str:
+    return hashlib.sha256("\n".join(paths).encode()).hexdigest()
+
+
+def load_checkpoint(path: str, output: str, fingerprint: str) -> tuple[int, int | None]:
+    """
+    :return: (images classified, writer position) at the checkpoint; (0, None) without one
+    """
+    if not os.path.exists(path):
+        return 0, None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("output") != output:
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint.get('output')}, not {output}")
+    # Rows are matched to paths by position, so any change to the list would skip or repeat images
+    if checkpoint.get("paths_sha256") != fingerprint:
+        raise SystemExit(f"The input images changed since checkpoint {path} was written; "
+                         f"restore them or delete the checkpoint to start over")
+    return checkpoint["processed"], checkpoint["position"]
+
+
+def save_checkpoint(path: str, output: str, fingerprint: str, processed: int, position: int):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"output": output, "paths_sha256": fingerprint, "processed": processed, "position": position}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="Image files or directories (walked recursively)")
+    parser.add_argument("--file-list", default=None, help="Text file with one image path per line")
+    parser.add_argument("--output", required=True, help="CSV file or Parquet directory")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--checkpoint", default=None, help="Default: <output>.checkpoint.json")
+    parser.add_argument("--model", default="CNN_50_epochs.h5")
+    parser.add_argument("--backend", choices=BACKENDS, default="keras")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="none")
+    parser.add_argument("--preprocessing", choices=list(INPUT_PREPROCESSING), default="unit")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--flush-every", type=int, default=20, help="Batches between output flushes")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"{args.output.rstrip(os.sep)}.checkpoint.json"
+    paths = collect_paths(args.inputs, args.file_list)
+    fingerprint = paths_fingerprint(paths)
+    skipped, position = load_checkpoint(checkpoint_path, args.output, fingerprint)
+    remaining = paths[skipped:]
+    print(f"{len(paths)} images, {skipped} already classified, {len(remaining)} to go")
+    if not remaining:
+        return
+
+    backend = load_backend(args.model, args.backend, args.quantization, preprocessing=args.preprocessing)
+    writer = CsvWriter(args.output, position) if args.format == "csv" else ParquetWriter(args.output, position)
+
+    processed = skipped
+    pending = []
+    started = time.perf_counter()
+    # spawn: decode workers do not need the parent's TensorFlow state
+    with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+        dataset = build_dataset(remaining, pool, args.batch_size, chunksize=max(1, args.batch_size // args.workers))
+        for batch_index, (batch_paths, images, ok) in enumerate(dataset.as_numpy_iterator(), start=1):
+            pending.extend(result_rows(batch_paths, backend.predict(INPUT_PREPROCESSING[args.preprocessing](images)),
+                                       ok))
+            if batch_index % args.flush_every == 0:
+                writer.write(pending)
+                processed += len(pending)
+                pending = []
+                save_checkpoint(checkpoint_path, args.output, fingerprint, processed, writer.position)
+                rate = (processed - skipped) / (time.perf_counter() - started)
+                print(f"{processed}/{len(paths)} images, {rate:.1f} images/s")
+    if pending:
+        writer.write(pending)
+        processed += len(pending)
+        save_checkpoint(checkpoint_path, args.output, fingerprint, processed, writer.position)
+    writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Classified {processed - skipped} images in {elapsed:.1f}s, "
+          f"{(processed - skipped) / elapsed:.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Local CIFAR-10 store: uint8 image shards opened as memory maps, so training and
+evaluation run without network access and without float copies of the dataset.
+
+Usage:
+    python -m src.neural_network.dataset_store import-cifar10 --source cifar-10-python.tar.gz
+    python -m src.neural_network.dataset_store import-cifar10 --download
+    python -m src.neural_network.dataset_store import-uploads --processed-dir processed_store
+    python -m src.neural_network.dataset_store info
+
+Every split (train, test, uploads) is a directory of shard-NNNNN.u8 files
+with N x 32 x 32 x 3 RGB rows, labels.u8 with one class index per row and
+index.json listing the shards, the number of rows per class and what was
+imported. import-cifar10 reads the original archive (or the extracted
+cifar-10-batches-py directory, or the Keras download cache) batch by batch.
+import-uploads appends rows of the ProcessedImageStore that were not
+imported yet, converted from BGR to RGB, labelled with the class predicted
+when they were uploaded.
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import tarfile
+
+import numpy as np
+
+from src.services.inference import CLASSES
+from src.services.preprocessing import IMAGE_SIZE
+
+DEFAULT_ROOT = "datasets/cifar10"
+ROW_SHAPE = (*IMAGE_SIZE, 3)
+# One shard per CIFAR split, so a split opens as a single zero-copy array
+DEFAULT_SHARD_ROWS = 50_000
+CHUNK_ROWS = 1024
+
+CIFAR10_BATCHES = {"train": [f"data_batch_{i}" for i in range(1, 6)], "test": ["test_batch"]}
+KERAS_CACHE = os.path.join(os.path.expanduser("~"), ".keras", "datasets")
+
+
+class DatasetSplit:
+    """
+    Read-only view of one split. Shards are memory-mapped; nothing is read until used.
+    """
+
+    def __init__(self, root: str, split: str):
+        self.directory = os.path.join(root, split)
+        index_path = os.path.join(self.directory, "index.json")
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(
+                f"Split {split} not found in {root}; import it with python -m src.neural_network.dataset_store"
+            )
+        with open(index_path) as f:
+            self.index = json.load(f)
+        self.shards = [
+            np.memmap(os.path.join(self.directory, shard["file"]), dtype=np.uint8, mode="r",
+                      shape=(shard["rows"], *ROW_SHAPE))
+            for shard in self.index["shards"] if shard["rows"]
+        ]
+        self.labels = np.fromfile(os.path.join(self.directory, "labels.u8"), dtype=np.uint8,
+                                  count=self.index["rows"])
+
+    def __len__(self):
+        return self.index["rows"]
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (images, labels); the images are the memory map itself when the split has one shard.
+        """
+        if len(self.shards) == 1:
+            return self.shards[0], self.labels
+        if not self.shards:
+            return np.zeros((0, *ROW_SHAPE), dtype=np.uint8), self.labels
+        return np.concatenate(self.shards), self.labels
+
+    def batches(self, batch_size: int, shuffle: bool = False, seed: int = 0):
+        """
+        Yield (images, labels) batches. In order, a batch inside one shard is a view of the
+        memory map; shuffled, each batch gathers its rows from one shard in file order.
+        """
+        rng = np.random.default_rng(seed)
+        offset = 0
+        spans = []
+        for shard in self.shards:
+            spans.append((shard, offset))
+            offset += len(shard)
+        if shuffle:
+            rng.shuffle(spans)
+        for shard, offset in spans:
+            if shuffle:
+                order = rng.permutation(len(shard))
+                for start in range(0, len(shard), batch_size):
+                    rows = np.sort(order[start:start + batch_size])
+                    yield shard[rows], self.labels[offset + rows]
+            else:
+                for start in range(0, len(shard), batch_size):
+                    yield shard[start:start + batch_size], self.labels[offset + start:offset + start + batch_size]
+
+
+def open_split(split: str, root: str = DEFAULT_ROOT) -> DatasetSplit:
+    return DatasetSplit(root, split)
+
+
+def load_splits(splits: list[str], root: str = DEFAULT_ROOT) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Images and labels of one or more splits; copies only when more than one array is joined.
+    """
+    arrays = [open_split(split, root).arrays() for split in splits]
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.concatenate([images for images, _ in arrays]), np.concatenate([labels for _, labels in arrays])
+
+
+def array_dataset(images: np.ndarray, labels: np.ndarray | None = None, chunk_rows: int = CHUNK_ROWS):
+    """
+    tf.data rows of (possibly memory-mapped) arrays, read chunk by chunk. Unlike
+    from_tensor_slices, the arrays are not copied into the graph as a whole.
+    """
+    import tensorflow as tf
+
+    def generate():
+        for start in range(0, len(images), chunk_rows):
+            if labels is None:
+                yield np.asarray(images[start:start + chunk_rows])
+            else:
+                yield np.asarray(images[start:start + chunk_rows]), np.asarray(labels[start:start + chunk_rows])
+
+    image_spec = tf.TensorSpec((None, *images.shape[1:]), tf.as_dtype(images.dtype))
+    signature = image_spec if labels is None else (
+        image_spec, tf.TensorSpec((None, *labels.shape[1:]), tf.as_dtype(labels.dtype)))
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=signature).unbatch()
+    return dataset.apply(tf.data.experimental.assert_cardinality(len(images)))
+
+
+class SplitWriter:
+    """
+    Writes a split, starting a new shard every shard_rows rows. A new split is
+    built next to the old one and replaces it on close; when appending, rows
+    become visible to readers once close() rewrites the index.
+    """
+
+    def __init__(self, root: str, split: str, shard_rows: int = DEFAULT_SHARD_ROWS, append: bool = False):
+        self.final_directory = os.path.join(root, split)
+        self.shard_rows = shard_rows
+        if append and os.path.exists(os.path.join(self.final_directory, "index.json")):
+            self.directory = self.final_directory
+            with open(os.path.join(self.directory, "index.json")) as f:
+                self.index = json.load(f)
+        else:
+            self.directory = f"{self.final_directory}.tmp"
+            if os.path.exists(self.directory):
+                shutil.rmtree(self.directory)
+            self.index = {"rows": 0, "shards": [], "label_counts": [0] * len(CLASSES), "sources": {}}
+        os.makedirs(self.directory, exist_ok=True)
+        # Rows past the index were written by an interrupted import
+        labels_path = os.path.join(self.directory, "labels.u8")
+        if os.path.exists(labels_path):
+            os.truncate(labels_path, self.index["rows"])
+        for shard in self.index["shards"]:
+            os.truncate(os.path.join(self.directory, shard["file"]), shard["rows"] * int(np.prod(ROW_SHAPE)))
+        self._labels = open(labels_path, "ab")
+
+    def append(self, images: np.ndarray, labels: np.ndarray):
+        labels = np.asarray(labels, dtype=np.uint8).reshape(-1)
+        position = 0
+        while position < len(images):
+            if not self.index["shards"] or self.index["shards"][-1]["rows"] >= self.shard_rows:
+                self.index["shards"].append({"file": f"shard-{len(self.index['shards']):05d}.u8", "rows": 0})
+            shard = self.index["shards"][-1]
+            count = min(self.shard_rows - shard["rows"], len(images) - position)
+            # A new shard overwrites leftovers of an interrupted import
+            with open(os.path.join(self.directory, shard["file"]), "ab" if shard["rows"] else "wb") as f:
+                f.write(np.ascontiguousarray(images[position:position + count], dtype=np.uint8).tobytes())
+            self._labels.write(labels[position:position + count].tobytes())
+            shard["rows"] += count
+            position += count
+        self.index["rows"] += len(images)
+        counts = np.bincount(labels, minlength=len(CLASSES))
+        self.index["label_counts"] = [int(a + b) for a, b in zip(self.index["label_counts"], counts)]
+
+    def close(self):
+        self._labels.close()
+        path = os.path.join(self.directory, "index.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+        if self.directory != self.final_directory:
+            if os.path.exists(self.final_directory):
+                shutil.rmtree(self.final_directory)
+            os.replace(self.directory, self.final_directory)
+            self.directory = self.final_directory
+
+
+def _read_batch(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    batch = pickle.loads(data, encoding="bytes")
+    # Rows are stored channel-first: 1024 red, 1024 green, 1024 blue values
+    images = np.asarray(batch[b"data"], dtype=np.uint8).reshape(-1, 3, *IMAGE_SIZE).transpose(0, 2, 3, 1)
+    return images, np.asarray(batch[b"labels"], dtype=np.uint8)
+
+
+def find_cifar10_source() -> str | None:
+    for path in (os.path.join(KERAS_CACHE, "cifar-10-batches-py-target", "cifar-10-batches-py"),
+                 os.path.join(KERAS_CACHE, "cifar-10-batches-py"),
+                 os.path.join(KERAS_CACHE, "cifar-10-batches-py-target_archive"),
+                 "cifar-10-python.tar.gz"):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_cifar10_batches(source: str, split: str):
+    """
+    Yield (images, labels) of every original batch file of a split.
+
+    :param source: str: cifar-10-python.tar.gz or the extracted cifar-10-batches-py directory
+    """
+    names = CIFAR10_BATCHES[split]
+    if os.path.isdir(source):
+        for name in names:
+            with open(os.path.join(source, name), "rb") as f:
+                yield _read_batch(f.read())
+        return
+    with tarfile.open(source) as archive:
+        members = {os.path.basename(member.name): member for member in archive.getmembers() if member.isfile()}
+        for name in names:
+            yield _read_batch(archive.extractfile(members[name]).read())
+
+
+def import_cifar10(root: str, source: str | None, download: bool, shard_rows: int):
+    if source is None:
+        source = find_cifar10_source()
+    if source is None and download:
+        import tensorflow as tf
+
+        tf.keras.datasets.cifar10.load_data()
+        source = find_cifar10_source()
+    if source is None:
+        raise SystemExit("CIFAR-10 not found: pass --source cifar-10-python.tar.gz or --download")
+    for split in CIFAR10_BATCHES:
+        writer = SplitWriter(root, split, shard_rows)
+        for images, labels in read_cifar10_batches(source, split):
+            writer.append(images, labels)
+        writer.index["sources"] = {"cifar10": os.path.abspath(source)}
+        writer.close()
+        print(f"{split}: {writer.index['rows']} images in {len(writer.index['shards'])} shards")
+
+
+def import_uploads(root: str, processed_dir: str, split: str, shard_rows: int):
+    from src.services.processed_store import load_processed_dataset
+
+    images, labels = load_processed_dataset(processed_dir)
+    writer = SplitWriter(root, split, shard_rows, append=True)
+    key = os.path.abspath(processed_dir)
+    done = writer.index["sources"].get(key, 0)
+    for start in range(done, len(images), CHUNK_ROWS):
+        # The store keeps model inputs in OpenCV BGR order
+        writer.append(images[start:start + CHUNK_ROWS][..., ::-1], labels[start:start + CHUNK_ROWS])
+    writer.index["sources"][key] = len(images)
+    writer.close()
+    print(f"{split}: {len(images) - done} new images, {writer.index['rows']} in total")
+
+
+def print_info(root: str):
+    for split in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        try:
+            data = open_split(split, root)
+        except FileNotFoundError:
+            continue
+        counts = ", ".join(f"{label} {count}" for label, count in zip(CLASSES, data.index["label_counts"]))
+        print(f"{split}: {len(data)} images in {len(data.shards)} shards ({counts})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    commands = parser.add_subparsers(dest="command", required=True)
+    cifar = commands.add_parser("import-cifar10")
+    cifar.add_argument("--source", default=None, help="cifar-10-python.tar.gz or extracted cifar-10-batches-py")
+    cifar.add_argument("--download", action="store_true", help="Download through Keras if no local copy is found")
+    cifar.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS)
+    uploads = commands.add_parser("import-uploads")
+    uploads.add_argument("--processed-dir", default="processed_store")
+    uploads.add_argument("--split", default="uploads")
+    uploads.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS)
+    commands.add_parser("info")
+    args = parser.parse_args()
+
+    if args.command == "import-cifar10":
+        import_cifar10(args.root, args.source, args.download, args.shard_rows)
+    elif args.command == "import-uploads":
+        import_uploads(args.root, args.processed_dir, args.split, args.shard_rows)
+    else:
+        print_info(args.root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Distill the ResNet50 model into a small CNN that serves at CNN_50 cost.
+
+Usage:
+    python -m src.neural_network.distill --teacher ResNet50_model.keras
+    python -m src.neural_network.distill --teacher ResNet50_model.keras --width 0.5 --temperature 4 --alpha 0.9
+
+The student is the CNN_50 layout with every layer width multiplied by
+--width. It learns from the teacher's class probabilities softened by
+--temperature, mixed with the true labels by --alpha (Hinton et al., 2015).
+Teacher probabilities are computed once per run and kept in the checkpoint
+directory; with a ResNet50 from train_resnet50_head and its feature cache
+they come from the cached features instead of a backbone pass. Training
+resumes like src.neural_network.train.
+
+Teacher and student both see the RGB images of the dataset store: the
+teacher through resnet50.preprocess_input (or features extracted with it),
+the student scaled to [0, 1]. main.py decodes uploads as BGR, so the report
+also gives served_accuracy, the test accuracy of each saved model fed BGR
+images through its serving preprocessing; it must match test_accuracy.
+
+The student is saved with a softmax output to --output, served with the
+"unit" input preprocessing. The report lists accuracy, parameter count and
+single-image and batched CPU latency of the student, the teacher and the
+--baseline model (CNN_50_epochs.h5).
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.neural_network.architectures import (CNN50_CONV_FILTERS, CNN50_DENSE_UNITS, CNN50_DROPOUT, NUM_CLASSES,
+                                              build_cnn)
+from src.neural_network.dataset_store import DEFAULT_ROOT, array_dataset
+from src.neural_network.feature_cache import backbone_identity, feature_batches, find_features
+from src.neural_network.latency import measure_latency
+from src.neural_network.train import (configure_threads, fit, load_cifar10, make_dataset, save_model,
+                                      write_report)
+from src.services import inference
+
+
+def soften(probabilities: np.ndarray, temperature: float) -> np.ndarray:
+    """
+    Softmax of log-probabilities divided by the temperature; the teacher only exposes probabilities.
+    """
+    logits = np.log(np.clip(probabilities, 1e-8, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return (exp / exp.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def teacher_probabilities(teacher: tf.keras.Model, images: np.ndarray, feature_dir: str | None, split: str,
+                          batch_size: int) -> np.ndarray:
+    """
+    Class probabilities of the teacher for uint8 RGB images. A teacher assembled by
+    train_resnet50_head is applied to cached features of the same images when they were
+    extracted by its own backbone weights.
+    """
+    layers = {layer.name: layer for layer in teacher.layers}
+    head, backbone = layers.get("resnet50_head"), layers.get("resnet50_backbone")
+    cached = None
+    if head is not None and backbone is not None and feature_dir:
+        cached = find_features(feature_dir, split, images, backbone_identity(backbone))
+    if cached is not None:
+        return head.predict(feature_batches(cached[0], cached[1], 1024), verbose=0)
+    dataset = (array_dataset(images)
+               .batch(batch_size)
+               .map(lambda batch: tf.keras.applications.resnet50.preprocess_input(tf.cast(batch, tf.float32)),
+                    num_parallel_calls=tf.data.AUTOTUNE)
+               .prefetch(tf.data.AUTOTUNE))
+    return teacher.predict(dataset, verbose=2)
+
+
+def cached_teacher_probabilities(path: str, compute) -> np.ndarray:
+    if os.path.exists(path):
+        return np.load(path)
+    probabilities = compute()
+    np.save(f"{path}.tmp.npy", probabilities)
+    os.replace(f"{path}.tmp.npy", path)
+    return probabilities
+
+
+def distillation_loss(temperature: float, alpha: float):
+    """
+    Targets are one-hot labels followed by softened teacher probabilities; predictions are student logits.
+    """
+    def loss(targets, logits):
+        hard, soft = targets[:, :NUM_CLASSES], targets[:, NUM_CLASSES:]
+        student = tf.keras.losses.categorical_crossentropy(hard, logits, from_logits=True)
+        # Scaled by T^2 so gradients of the soft term keep their size as the temperature changes
+        distilled = tf.keras.losses.categorical_crossentropy(soft, logits / temperature, from_logits=True)
+        return alpha * temperature ** 2 * distilled + (1 - alpha) * student
+
+    return loss
+
+
+def accuracy(targets, logits):
+    return tf.cast(tf.equal(tf.argmax(targets[:, :NUM_CLASSES], axis=1), tf.argmax(logits, axis=1)), tf.float32)
+
+
+def scaled(values: tuple[int, ...], width: float) -> tuple[int, ...]:
+    return tuple(max(8, round(v * width)) for v in values)
+
+
+def served_accuracy(name: str, images: np.ndarray, labels: np.ndarray, batch_size: int = 256) -> float:
+    """
+    Accuracy of a loaded model on uint8 RGB images passed in the BGR order main.py decodes uploads in.
+    """
+    predictions = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size, ..., ::-1].astype(np.float32) / 255.0
+        predictions.append(inference.predict_model(name, batch).argmax(axis=1))
+    return float((np.concatenate(predictions) == labels).mean())
+
+
+def describe_model(name: str, path: str, preprocessing: str, accuracy_value: float | None,
+                   x_test: np.ndarray, y_test: np.ndarray, latency_batch_size: int, repeats: int) -> dict:
+    """
+    Parameter count, served accuracy and latency of a saved model loaded the way main.py loads it.
+    """
+    model = inference.load_model(name, path, preprocessing)
+    row = {
+        "model": name,
+        "path": path,
+        "parameters": model.model.count_params(),
+        "size_bytes": os.path.getsize(path),
+        "test_accuracy": accuracy_value,
+        "served_accuracy": served_accuracy(name, x_test, y_test),
+        "latency_single": measure_latency(name, 1, repeats),
+        "latency_batched": measure_latency(name, latency_batch_size, max(5, repeats // 5)),
+    }
+    inference.unload_model(name)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teacher", default="ResNet50_model.keras")
+    parser.add_argument("--baseline", default="CNN_50_epochs.h5", help='Compared in the report, "none" to skip')
+    parser.add_argument("--feature-dir", default="features/resnet50", help="Feature cache of train_resnet50_head")
+    parser.add_argument("--output", default="CNN_distilled.h5")
+    parser.add_argument("--checkpoint-dir", default="checkpoints/distill")
+    parser.add_argument("--width", type=float, default=0.25, help="Multiplier of CNN_50 layer widths")
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--alpha", type=float, default=0.9, help="Weight of the teacher term, 1 - alpha for labels")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--teacher-batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--patience", type=int, default=10, help="0 disables early stopping")
+    parser.add_argument("--augment", action="store_true")
+    parser.add_argument("--data-dir", default=DEFAULT_ROOT)
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N images of each split")
+    parser.add_argument("--latency-batch-size", type=int, default=64)
+    parser.add_argument("--latency-repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads")
+    parser.add_argument("--inter-op-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    configure_threads(args.threads, args.inter_op_threads)
+    tf.keras.utils.set_random_seed(args.seed)
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    (x_train, y_train), (x_test, y_test) = load_cifar10(args.data_dir)
+    x_train, y_train = x_train[:args.limit], y_train[:args.limit]
+    x_test, y_test = x_test[:args.limit], y_test[:args.limit]
+
+    teacher = tf.keras.models.load_model(args.teacher)
+    # Saved probabilities are reused only for the same teacher file and number of images
+    teacher_stamp = f"{os.path.getmtime(args.teacher):.0f}"
+    started = time.perf_counter()
+    train_probabilities, test_probabilities = (
+        cached_teacher_probabilities(
+            os.path.join(args.checkpoint_dir, f"teacher_{split}_{len(images)}_{teacher_stamp}.npy"),
+            lambda: teacher_probabilities(teacher, images, args.feature_dir, split, args.teacher_batch_size),
+        )
+        for split, images in (("train", x_train), ("test", x_test))
+    )
+    teacher_seconds = time.perf_counter() - started
+    teacher_accuracy = float((test_probabilities.argmax(axis=1) == y_test).mean())
+    print(f"Teacher probabilities ready in {teacher_seconds:.1f}s, teacher accuracy {teacher_accuracy:.4f}")
+    del teacher
+
+    def targets(labels, probabilities):
+        return np.concatenate([np.eye(NUM_CLASSES, dtype=np.float32)[labels],
+                               soften(probabilities, args.temperature)], axis=1)
+
+    conv_filters, dense_units = scaled(CNN50_CONV_FILTERS, args.width), scaled(CNN50_DENSE_UNITS, args.width)
+    student = build_cnn(conv_filters, dense_units, CNN50_DROPOUT, name="student", logits=True)
+    student.compile(loss=distillation_loss(args.temperature, args.alpha),
+                    optimizer=tf.keras.optimizers.Adam(args.learning_rate), metrics=[accuracy])
+    train_dataset = make_dataset(x_train, targets(y_train, train_probabilities), args.batch_size, training=True,
+                                 augment=args.augment, seed=args.seed)
+    test_dataset = make_dataset(x_test, targets(y_test, test_probabilities), args.batch_size)
+    history = fit(student, train_dataset, test_dataset, args.epochs, args.checkpoint_dir, args.patience or None)
+    _, student_accuracy = student.evaluate(test_dataset, verbose=0)
+
+    # The same layers with a softmax output, as main.py expects probabilities
+    deployable = build_cnn(conv_filters, dense_units, CNN50_DROPOUT, name="student")
+    deployable.set_weights(student.get_weights())
+    save_model(deployable, args.output)
+
+    models = [describe_model("student", args.output, "unit", student_accuracy, x_test, y_test,
+                             args.latency_batch_size, args.latency_repeats),
+              describe_model("teacher", args.teacher, "resnet50", teacher_accuracy, x_test, y_test,
+                             args.latency_batch_size, args.latency_repeats)]
+    if args.baseline != "none" and os.path.exists(args.baseline):
+        baseline = tf.keras.models.load_model(args.baseline)
+        baseline_accuracy = float((baseline.predict(make_dataset(x_test, y_test, 256), verbose=0).argmax(axis=1)
+                                   == y_test).mean())
+        del baseline
+        models.append(describe_model("baseline", args.baseline, "unit", baseline_accuracy, x_test, y_test,
+                                     args.latency_batch_size, args.latency_repeats))
+
+    print(f"{'model':<9} {'params':>11} {'accuracy':>9} {'served':>9} {'1 img, ms':>10} "
+          f"{f'{args.latency_batch_size} img, ms':>11} {'img/s':>8}")
+    for row in models:
+        single, batched = row["latency_single"], row["latency_batched"]
+        print(f"{row['model']:<9} {row['parameters']:>11,} {row['test_accuracy']:>9.4f} "
+              f"{row['served_accuracy']:>9.4f} {single['ms_p50']:>10.2f} {batched['ms_p50']:>11.2f} "
+              f"{batched['images_per_second']:>8.0f}")
+        # Training and serving disagree on the input, e.g. the channel order
+        if abs(row["served_accuracy"] - row["test_accuracy"]) > 0.01:
+            print(f"WARNING: {row['model']} serves at {row['served_accuracy']:.4f} accuracy "
+                  f"but scored {row['test_accuracy']:.4f} on the training input")
+
+    report_path = f"{os.path.splitext(args.output)[0]}.json"
+    write_report(report_path, {
+        "model": args.output,
+        "arguments": vars(args),
+        "tensorflow": tf.__version__,
+        "student": {"conv_filters": conv_filters, "dense_units": dense_units},
+        "teacher_seconds_this_run": teacher_seconds,
+        "epochs": len(history),
+        "history": history,
+        "comparison": models,
+    })
+    print(f"Model written to {args.output}, report to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Evaluate a model artifact on the CIFAR-10 test split and benchmark its CPU latency.
+
+Usage:
+    python -m src.neural_network.evaluate --model CNN_50_epochs.h5
+    python -m src.neural_network.evaluate --model ResNet50_model.keras --preprocessing resnet50
+    python -m src.neural_network.evaluate --model CNN_50_epochs.h5 --backend tflite --quantization int8 \\
+        --batch-sizes 1,8,32,128 --threads 1,2,4
+
+The model is loaded and fed through inference.load_model/predict_model,
+exactly as main.py serves it, including the input preprocessing. Reported:
+top-1 and top-5 accuracy, accuracy per class, the confusion matrix and the
+throughput of the batched evaluation, then latency and throughput for every
+combination of --batch-sizes and --threads. Each thread count is measured in
+a fresh process, since TensorFlow fixes its thread pools at start-up.
+
+Test images are fed in the BGR order main.py decodes uploads in, so the
+channel handling of --preprocessing is evaluated as well.
+
+Results are written as JSON to benchmarks/results/ unless --output is given.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.neural_network.dataset_store import DEFAULT_ROOT
+from src.neural_network.latency import measure_with_threads
+from src.neural_network.train import load_cifar10
+from src.services import inference
+from src.services.backends import BACKENDS, QUANTIZATIONS
+from src.services.inference import CLASSES, INPUT_PREPROCESSING
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks", "results")
+
+
+def evaluate_predictions(probabilities: np.ndarray, labels: np.ndarray) -> dict:
+    predicted = probabilities.argmax(axis=1)
+    top5 = np.argsort(probabilities, axis=1)[:, -5:]
+    confusion = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+    np.add.at(confusion, (labels, predicted), 1)
+    per_class = confusion.diagonal() / np.maximum(confusion.sum(axis=1), 1)
+    return {
+        "images": len(labels),
+        "top1_accuracy": float((predicted == labels).mean()),
+        "top5_accuracy": float((top5 == labels[:, None]).any(axis=1).mean()),
+        "per_class_accuracy": {label: float(value) for label, value in zip(CLASSES, per_class)},
+        # Rows are true classes, columns predicted classes, in CLASSES order
+        "confusion_matrix": confusion.tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="CNN_50_epochs.h5")
+    parser.add_argument("--preprocessing", default="unit", choices=list(INPUT_PREPROCESSING))
+    parser.add_argument("--backend", default="keras", choices=BACKENDS)
+    parser.add_argument("--quantization", default="none", choices=QUANTIZATIONS)
+    parser.add_argument("--eval-batch-size", type=int, default=256)
+    parser.add_argument("--data-dir", default=DEFAULT_ROOT)
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate only the first N test images")
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1), help="Comma-separated thread counts")
+    parser.add_argument("--repeats", type=int, default=50, help="Timed forward passes of batch size 1")
+    parser.add_argument("--skip-latency", action="store_true")
+    parser.add_argument("--output", default=None, help=f"Default: {RESULTS_DIR}/eval_<model>_<time>.json")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    _, (x_test, y_test) = load_cifar10(args.data_dir)
+    # The store holds RGB; main.py decodes uploads with OpenCV as BGR
+    x_test, y_test = x_test[:args.limit, ..., ::-1], y_test[:args.limit]
+
+    inference.load_model("evaluate", args.model, args.preprocessing, args.backend, args.quantization)
+    started = time.perf_counter()
+    probabilities = np.concatenate([
+        inference.predict_model("evaluate", x_test[start:start + args.eval_batch_size].astype(np.float32) / 255.0)
+        for start in range(0, len(x_test), args.eval_batch_size)
+    ])
+    eval_seconds = time.perf_counter() - started
+    inference.unload_model("evaluate")
+    accuracy = evaluate_predictions(probabilities, y_test)
+    accuracy["images_per_second"] = len(x_test) / eval_seconds
+
+    print(f"Top-1 accuracy: {accuracy['top1_accuracy']:.4f}, top-5: {accuracy['top5_accuracy']:.4f}, "
+          f"{accuracy['images_per_second']:.0f} images/s at batch {args.eval_batch_size}")
+    for label, value in accuracy["per_class_accuracy"].items():
+        print(f"  {label:<11} {value:.4f}")
+
+    latency = []
+    if not args.skip_latency:
+        batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+        context = multiprocessing.get_context("spawn")
+        print(f"\n{'threads':>7} {'batch':>6} {'p50, ms':>9} {'p95, ms':>9} {'ms/img':>8} {'img/s':>8}")
+        for threads in (int(t) for t in args.threads.split(",")):
+            with context.Pool(1) as pool:
+                rows = pool.apply(measure_with_threads, (args.model, args.preprocessing, args.backend,
+                                                         args.quantization, threads, batch_sizes, args.repeats))
+            for row in rows:
+                print(f"{row['threads']:>7} {row['batch_size']:>6} {row['ms_p50']:>9.2f} {row['ms_p95']:>9.2f} "
+                      f"{row['ms_per_image']:>8.3f} {row['images_per_second']:>8.0f}")
+            latency.extend(rows)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"eval_{os.path.splitext(os.path.basename(args.model))[0]}_{started_at:%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "model": args.model,
+            "model_bytes": os.path.getsize(args.model),
+            "preprocessing": args.preprocessing,
+            "backend": args.backend,
+            "quantization": args.quantization,
+            "started_at": started_at.isoformat(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "accuracy": accuracy,
+            "latency": latency,
+        }, f, indent=2)
+    print(f"\nResults written to {os.path.normpath(output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare Keras and TFLite backends of a saved model on the CIFAR-10 test split.
+
+Usage:
+    python -m src.neural_network.evaluate_backends --model CNN_50_epochs.h5
+    python -m src.neural_network.evaluate_backends --model ResNet50_model.keras --preprocessing resnet50
+
+For every quantization option the model is converted, evaluated on the test
+split and compared with the Keras model: accuracy, accuracy difference,
+share of identical top-1 predictions, model size and inference time. Test
+and int8 calibration images get the --preprocessing the model is served
+with, on top of the BGR order main.py decodes uploads in.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.neural_network.dataset_store import DEFAULT_ROOT, load_splits
+from src.services.backends import (QUANTIZATIONS, KerasBackend, TFLiteBackend,
+                                   cifar10_calibration_images, convert_to_tflite)
+from src.services.inference import INPUT_PREPROCESSING
+
+
+def predict_in_batches(backend, images: np.ndarray, batch_size: int) -> tuple[np.ndarray, float]:
+    started = time.perf_counter()
+    predictions = [backend.predict(images[i:i + batch_size]) for i in range(0, len(images), batch_size)]
+    return np.concatenate(predictions), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="CNN_50_epochs.h5")
+    parser.add_argument("--preprocessing", default="unit", choices=list(INPUT_PREPROCESSING))
+    parser.add_argument("--quantization", nargs="+", default=QUANTIZATIONS, choices=QUANTIZATIONS)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--data-dir", default=DEFAULT_ROOT, help="Dataset store with the test split")
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate only the first N test images")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    x_test, y_test = load_splits(["test"], args.data_dir)
+    x_test = INPUT_PREPROCESSING[args.preprocessing](x_test[:args.limit, ..., ::-1].astype("float32") / 255.0)
+    y_test = y_test[:args.limit]
+
+    model = tf.keras.models.load_model(args.model)
+    keras_predictions, keras_seconds = predict_in_batches(KerasBackend(model), x_test, args.batch_size)
+    keras_top1 = keras_predictions.argmax(axis=1)
+    keras_accuracy = float((keras_top1 == y_test).mean())
+
+    report = [{
+        "backend": "keras",
+        "quantization": "none",
+        "accuracy": keras_accuracy,
+        "accuracy_delta": 0.0,
+        "agreement": 1.0,
+        "size_bytes": None,
+        "ms_per_image": keras_seconds * 1000 / len(x_test),
+    }]
+
+    calibration_images = cifar10_calibration_images(root=args.data_dir, preprocessing=args.preprocessing)
+    for quantization in args.quantization:
+        model_content = convert_to_tflite(model, quantization, calibration_images)
+        backend = TFLiteBackend(model_content, quantization)
+        predictions, seconds = predict_in_batches(backend, x_test, args.batch_size)
+        top1 = predictions.argmax(axis=1)
+        accuracy = float((top1 == y_test).mean())
+        report.append({
+            "backend": "tflite",
+            "quantization": quantization,
+            "accuracy": accuracy,
+            "accuracy_delta": accuracy - keras_accuracy,
+            "agreement": float((top1 == keras_top1).mean()),
+            "size_bytes": len(model_content),
+            "ms_per_image": seconds * 1000 / len(x_test),
+        })
+
+    print(f"{'backend':<8} {'quant':<8} {'accuracy':>9} {'delta':>8} {'agree':>7} {'size, KB':>10} {'ms/img':>8}")
+    for row in report:
+        size = f"{row['size_bytes'] / 1024:.0f}" if row["size_bytes"] else "-"
+        print(f"{row['backend']:<8} {row['quantization']:<8} {row['accuracy']:>9.4f} "
+              f"{row['accuracy_delta']:>+8.4f} {row['agreement']:>7.4f} {size:>10} {row['ms_per_image']:>8.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, "preprocessing": args.preprocessing, "test_images": len(x_test),
+                       "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
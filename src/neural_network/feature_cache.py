@@ -0,0 +1,161 @@
+"""
+Backbone features of a dataset split, computed once and kept in a
+memory-mapped file, so heads train without running the backbone every epoch.
+
+A split is stored as <split>.features.f16 (float16 rows, half the size of
+float32 and plenty for pooled ReLU activations), <split>.labels.u8 and
+<split>.json with the backbone identity, a fingerprint of the source images
+and the number of rows already written. An interrupted extraction continues
+from the last flushed row; a different backbone or dataset starts over.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.neural_network.dataset_store import array_dataset
+
+FEATURES_DTYPE = np.float16
+FINGERPRINT_CHUNK = 1024
+
+
+def _path(directory: str, split: str, suffix: str) -> str:
+    return os.path.join(directory, f"{split}{suffix}")
+
+
+def _read_meta(directory: str, split: str) -> dict | None:
+    try:
+        with open(_path(directory, split, ".json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory: str, split: str, meta: dict):
+    path = _path(directory, split, ".json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def fingerprint(images: np.ndarray) -> str:
+    digest = hashlib.sha256(str(images.shape).encode())
+    for start in range(0, len(images), FINGERPRINT_CHUNK):
+        digest.update(np.ascontiguousarray(images[start:start + FINGERPRINT_CHUNK]).data)
+    return digest.hexdigest()
+
+
+def backbone_identity(backbone: tf.keras.Model) -> str:
+    """
+    Name of the backbone and a fingerprint of its weights, the same for a backbone
+    rebuilt with the same seed or loaded back from a saved model.
+    """
+    digest = hashlib.sha256()
+    for weights in backbone.get_weights():
+        digest.update(str(weights.shape).encode())
+        digest.update(np.ascontiguousarray(weights).data)
+    return f"{backbone.name}:{digest.hexdigest()}"
+
+
+def open_features(directory: str, split: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: (read-only memmap of shape (n, feature size), labels)
+    :raises FileNotFoundError: when the split was not extracted completely
+    """
+    meta = _read_meta(directory, split)
+    if meta is None or meta["done"] < meta["count"]:
+        raise FileNotFoundError(f"Features of {split} are not extracted in {directory}")
+    features = np.memmap(_path(directory, split, ".features.f16"), dtype=FEATURES_DTYPE, mode="r",
+                         shape=(meta["count"], meta["feature_size"]))
+    labels = np.fromfile(_path(directory, split, ".labels.u8"), dtype=np.uint8, count=meta["count"])
+    return features, labels
+
+
+def find_features(directory: str, split: str, images: np.ndarray,
+                  identity: str) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Cached features of exactly these images from the backbone with this identity, or None.
+
+    :param identity: str: backbone_identity of the backbone the features must come from
+    """
+    meta = _read_meta(directory, split)
+    if (meta is None or meta["identity"] != identity or meta["count"] != len(images)
+            or meta["fingerprint"] != fingerprint(images)):
+        return None
+    try:
+        return open_features(directory, split)
+    except FileNotFoundError:
+        return None
+
+
+def extract_features(backbone: tf.keras.Model, preprocess, images: np.ndarray, labels: np.ndarray, directory: str,
+                     split: str, identity: str, batch_size: int = 32,
+                     flush_every: int = 50) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Run the backbone over images unless the split is already cached for the same backbone and images.
+
+    :param preprocess: Callable: Model input from a float32 batch of uint8 values
+    :param identity: str: backbone_identity of backbone; cached features of another identity are discarded
+    :param flush_every: int: Batches between progress checkpoints
+    :return: The same as open_features
+    """
+    os.makedirs(directory, exist_ok=True)
+    source = fingerprint(images)
+    meta = _read_meta(directory, split)
+    if meta is None or meta["identity"] != identity or meta["fingerprint"] != source:
+        feature_size = int(backbone.output_shape[-1])
+        meta = {"identity": identity, "fingerprint": source, "count": len(images),
+                "feature_size": feature_size, "done": 0}
+        np.memmap(_path(directory, split, ".features.f16"), dtype=FEATURES_DTYPE, mode="w+",
+                  shape=(len(images), feature_size)).flush()
+        np.asarray(labels, dtype=np.uint8).tofile(_path(directory, split, ".labels.u8"))
+        _write_meta(directory, split, meta)
+    if meta["done"] == meta["count"]:
+        return open_features(directory, split)
+
+    features = np.memmap(_path(directory, split, ".features.f16"), dtype=FEATURES_DTYPE, mode="r+",
+                         shape=(meta["count"], meta["feature_size"]))
+    dataset = (array_dataset(images[meta["done"]:])
+               .batch(batch_size)
+               .map(lambda batch: preprocess(tf.cast(batch, tf.float32)), num_parallel_calls=tf.data.AUTOTUNE)
+               .prefetch(tf.data.AUTOTUNE))
+    started = time.perf_counter()
+    first = position = meta["done"]
+    for step, batch in enumerate(dataset, start=1):
+        rows = backbone.predict_on_batch(batch)
+        features[position:position + len(rows)] = rows
+        position += len(rows)
+        if step % flush_every == 0 or position == meta["count"]:
+            features.flush()
+            meta["done"] = position
+            _write_meta(directory, split, meta)
+            rate = (position - first) / (time.perf_counter() - started)
+            print(f"{split}: {position}/{meta['count']} images, {rate:.1f} images/s")
+    del features
+    return open_features(directory, split)
+
+
+def feature_batches(features: np.ndarray, labels: np.ndarray, batch_size: int, training: bool = False,
+                    seed: int = 0) -> tf.data.Dataset:
+    """
+    Batches read from the memory map, never the whole array: every epoch draws a new
+    order when training, and rows of a batch are read in file order.
+    """
+    rng = np.random.default_rng(seed)
+
+    def generate():
+        order = rng.permutation(len(features)) if training else np.arange(len(features))
+        for start in range(0, len(order), batch_size):
+            rows = np.sort(order[start:start + batch_size])
+            yield features[rows].astype(np.float32), labels[rows]
+
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec((None, features.shape[1]), tf.float32),
+        tf.TensorSpec((None, *labels.shape[1:]), tf.as_dtype(labels.dtype)),
+    ))
+    # A known number of batches lets Keras show progress and skip its end-of-data warning
+    batches = -(-len(features) // batch_size)
+    return dataset.apply(tf.data.experimental.assert_cardinality(batches)).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,54 @@
+"""
+CPU latency of a model artifact through the same loading and preprocessing path as main.py.
+"""
+import statistics
+import time
+
+import numpy as np
+
+from src.services import inference
+from src.services.preprocessing import IMAGE_SIZE
+
+
+def measure_latency(name: str, batch_size: int, repeats: int = 50, warmup: int = 5, seed: int = 0) -> dict:
+    """
+    Time forward passes of a model loaded with inference.load_model.
+
+    :param name: str: Name the model was loaded under
+    :return: Percentiles of one forward pass in milliseconds and images per second
+    """
+    batch = np.random.default_rng(seed).random((batch_size, *IMAGE_SIZE, 3), dtype=np.float32)
+    for _ in range(warmup):
+        inference.predict_model(name, batch)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        inference.predict_model(name, batch)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "batch_size": batch_size,
+        "ms_p50": statistics.median(timings),
+        "ms_p95": float(np.percentile(timings, 95)),
+        "ms_per_image": statistics.median(timings) / batch_size,
+        "images_per_second": batch_size * 1000 / statistics.median(timings),
+    }
+
+
+def measure_with_threads(model: str, preprocessing: str, backend: str, quantization: str, threads: int,
+                         batch_sizes: list[int], repeats: int) -> list[dict]:
+    """
+    Latency of every batch size with thread pools of the given size. Meant to run
+    in a fresh (spawned) process: TensorFlow fixes its thread pools at start-up.
+    """
+    from src.neural_network.train import configure_threads
+
+    configure_threads(threads, 1)
+    inference.load_model("benchmark", model, preprocessing, backend, quantization, threads)
+    rows = []
+    for batch_size in batch_sizes:
+        # Large batches take long enough that fewer repeats give a stable median
+        rows.append({"threads": threads,
+                     **measure_latency("benchmark", batch_size, max(5, repeats // max(1, batch_size // 8)))})
+    inference.unload_model("benchmark")
+    return rows
@@ -0,0 +1,348 @@
+"""
+Hyperparameter sweep of the CNN_50 network over a pool of CPU worker processes,
+the scripted replacement of tuning CNN_50.ipynb by hand.
+
+Usage:
+    python -m src.neural_network.sweep run --name filters \\
+        --conv-filters 264,128,512,128,128,128 128,64,256,64,64,64 --dropout 0.2,0.25,0.35,0.5 0.3,0.3,0.4,0.5 \\
+        --patience 5 10 --epochs 30
+    python -m src.neural_network.sweep run --name lr --learning-rate 0.001 0.0005 0.0002 --batch-size 32 64 \\
+        --trials 4 --workers 2 --threads 4
+    python -m src.neural_network.sweep report --name filters --top 10
+
+Every option of run that takes several values adds a dimension to the grid;
+--trials samples that many combinations of it at random. Trials run in
+spawned processes, one trial per process, each with --threads intra-op
+threads (also the size of its tf.data thread pool) and --inter-op-threads.
+By default workers x threads fills the available cores, and on Linux every
+worker is bound to its own set of cores, so parallel trials do not compete
+for the same ones.
+
+A trial stops when its validation loss does not improve for --patience
+epochs, like in the notebook, or earlier by the median stopping rule: after
+--grace-epochs, a trial whose best validation loss is worse than the median
+of the best losses other trials of the sweep had reached by the same epoch is
+pruned. Trials, their timings and the metrics of every epoch are stored in
+--database (SQLite by default, any SQLAlchemy URL works). Running the same
+sweep again skips finished and pruned trials and resumes interrupted ones
+from their checkpoints.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import Session
+
+from src.models.sweeps import SweepEpochModel, SweepTrialModel
+from src.neural_network.architectures import CNN50_CONV_FILTERS, CNN50_DENSE_UNITS, CNN50_DROPOUT
+from src.neural_network.dataset_store import DEFAULT_ROOT
+from src.neural_network.train import parse_floats, parse_ints
+
+DEFAULT_DATABASE = "sqlite:///sweeps.db"
+# Trials whose status means the result is final; others are run again
+FINISHED = ("complete", "pruned")
+
+
+def open_database(url: str):
+    # SQLite locks the whole file on write; workers wait for each other instead of failing
+    engine = create_engine(url, connect_args={"timeout": 60} if url.startswith("sqlite") else {})
+    SweepTrialModel.metadata.create_all(engine, tables=[SweepTrialModel.__table__, SweepEpochModel.__table__])
+    return engine
+
+
+def params_key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True)
+
+
+def grid(space: dict[str, list], trials: int | None, seed: int) -> list[dict]:
+    """
+    Every combination of the values in space, or a random sample of trials of them.
+    """
+    names = list(space)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if trials is not None and trials < len(combinations):
+        combinations = random.Random(seed).sample(combinations, trials)
+    return combinations
+
+
+def core_sets(workers: int, threads: int) -> list[list[int]]:
+    """
+    Disjoint groups of the cores this process may use, one per worker; empty
+    groups (no binding) when the platform cannot bind or there are too few cores.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [[] for _ in range(workers)]
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < workers * threads:
+        return [[] for _ in range(workers)]
+    return [cores[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def median_stop(session: Session, trial: SweepTrialModel, epoch: int, best_loss: float, min_trials: int) -> bool:
+    """
+    Median stopping rule: True when best_loss is worse than the median of the
+    best validation losses other trials of the sweep reached by this epoch.
+    """
+    rows = session.execute(
+        select(SweepEpochModel.trial_id, SweepEpochModel.val_loss)
+        .join(SweepTrialModel, SweepTrialModel.id == SweepEpochModel.trial_id)
+        .where(SweepTrialModel.sweep == trial.sweep, SweepEpochModel.trial_id != trial.id,
+               SweepEpochModel.epoch <= epoch, SweepEpochModel.val_loss.is_not(None))
+    ).all()
+    best = {}
+    for trial_id, val_loss in rows:
+        best[trial_id] = min(val_loss, best.get(trial_id, val_loss))
+    return len(best) >= min_trials and best_loss > statistics.median(best.values())
+
+
+def run_trial(database: str, trial_id: int, args: dict, core_queue) -> str:
+    """
+    Train one trial and store the result. Runs in a fresh (spawned) process:
+    TensorFlow fixes its thread pools at start-up.
+    """
+    cores = core_queue.get()
+    engine = open_database(database)
+    try:
+        if cores:
+            os.sched_setaffinity(0, cores)
+        with Session(engine) as session:
+            trial = session.get(SweepTrialModel, trial_id)
+            trial.status, trial.host, trial.cores = "running", platform.node(), cores
+            trial.threads, trial.inter_op_threads = args["threads"], args["inter_op_threads"]
+            trial.started_at, trial.finished_at, trial.error = datetime.now(), None, None
+            session.commit()
+            try:
+                status = train_trial(session, trial, args)
+            except Exception:
+                session.rollback()
+                trial.status, trial.error = "failed", traceback.format_exc()
+                status = "failed"
+            trial.finished_at = datetime.now()
+            session.commit()
+            return status
+    finally:
+        engine.dispose()
+        core_queue.put(cores)
+
+
+def train_trial(session: Session, trial: SweepTrialModel, args: dict) -> str:
+    import tensorflow as tf
+
+    from src.neural_network.architectures import build_cnn
+    from src.neural_network.train import configure_threads, fit, load_cifar10, make_dataset
+
+    configure_threads(args["threads"], args["inter_op_threads"])
+    tf.keras.utils.set_random_seed(args["seed"])
+    params = trial.params
+
+    (x_train, y_train), (x_test, y_test) = load_cifar10(args["data_dir"])
+    x_train, y_train = x_train[:args["limit"]], y_train[:args["limit"]]
+    x_test, y_test = x_test[:args["validation_limit"]], y_test[:args["validation_limit"]]
+    options = tf.data.Options()
+    options.threading.private_threadpool_size = args["threads"] or 0
+    train_dataset = make_dataset(x_train, y_train, params["batch_size"], training=True, augment=params["augment"],
+                                 seed=args["seed"]).with_options(options)
+    test_dataset = make_dataset(x_test, y_test, params["batch_size"]).with_options(options)
+
+    model = build_cnn(params["conv_filters"], params["dense_units"], params["dropout"])
+    model.compile(loss="sparse_categorical_crossentropy",
+                  optimizer=tf.keras.optimizers.Adam(params["learning_rate"]), metrics=["accuracy"])
+    trial.parameters = model.count_params()
+    session.commit()
+
+    class Recorder(tf.keras.callbacks.Callback):
+        """
+        Stores the metrics of every epoch and applies the median stopping rule.
+        """
+        pruned = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            logs = logs or {}
+            # An epoch replayed after a resume replaces its earlier row
+            session.execute(delete(SweepEpochModel).where(SweepEpochModel.trial_id == trial.id,
+                                                          SweepEpochModel.epoch == epoch + 1))
+            session.add(SweepEpochModel(
+                trial_id=trial.id, epoch=epoch + 1, loss=logs.get("loss"), accuracy=logs.get("accuracy"),
+                val_loss=logs.get("val_loss"), val_accuracy=logs.get("val_accuracy"),
+                epoch_seconds=logs.get("epoch_seconds"),
+            ))
+            session.commit()
+            losses = session.scalars(select(SweepEpochModel.val_loss).where(
+                SweepEpochModel.trial_id == trial.id, SweepEpochModel.val_loss.is_not(None))).all()
+            if epoch + 1 >= args["grace_epochs"] and losses and median_stop(
+                    session, trial, epoch + 1, min(losses), args["min_trials"]):
+                print(f"Trial {trial.id} pruned after epoch {epoch + 1}")
+                self.pruned = True
+                self.model.stop_training = True
+
+    checkpoint_dir = os.path.join(args["checkpoint_dir"], trial.sweep, str(trial.id))
+    if not os.path.exists(os.path.join(checkpoint_dir, "backup")):
+        # fit starts from scratch, so do the stored epochs
+        session.execute(delete(SweepEpochModel).where(SweepEpochModel.trial_id == trial.id))
+        session.commit()
+    recorder = Recorder()
+    started = time.perf_counter()
+    history = fit(model, train_dataset, test_dataset, args["epochs"], checkpoint_dir, params["patience"] or None,
+                  extra_callbacks=[recorder])
+    trial.train_seconds = time.perf_counter() - started
+    # fit restored the weights with the lowest validation loss
+    trial.val_loss, trial.val_accuracy = (float(value) for value in model.evaluate(test_dataset, verbose=0))
+    trial.epochs = len(history)
+    epoch_seconds = [row["epoch_seconds"] for row in history if "epoch_seconds" in row]
+    trial.seconds_per_epoch = statistics.median(epoch_seconds) if epoch_seconds else None
+    trial.status = "pruned" if recorder.pruned else "complete"
+    if not args["keep_checkpoints"]:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return trial.status
+
+
+def plan_trials(engine, sweep: str, combinations: list[dict]) -> list[int]:
+    """
+    Ids of the trials still to run, adding new combinations to the database.
+    """
+    with Session(engine) as session:
+        existing = {trial.params_key: trial for trial in session.scalars(
+            select(SweepTrialModel).where(SweepTrialModel.sweep == sweep))}
+        pending = []
+        for params in combinations:
+            trial = existing.get(params_key(params))
+            if trial is None:
+                trial = SweepTrialModel(sweep=sweep, params_key=params_key(params), params=params, status="pending")
+                session.add(trial)
+            elif trial.status in FINISHED:
+                continue
+            pending.append(trial)
+        session.commit()
+        return [trial.id for trial in pending]
+
+
+def run(args):
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    threads = args.threads or max(1, available // (args.workers or max(1, available // 4)))
+    workers = args.workers or max(1, available // threads)
+    space = {
+        "conv_filters": args.conv_filters,
+        "dense_units": args.dense_units,
+        "dropout": args.dropout,
+        "learning_rate": args.learning_rate,
+        "batch_size": args.batch_size,
+        "patience": args.patience,
+        "augment": [value == "on" for value in args.augment],
+    }
+    engine = open_database(args.database)
+    trial_ids = plan_trials(engine, args.name, grid(space, args.trials, args.seed))
+    engine.dispose()
+    print(f"Sweep {args.name}: {len(trial_ids)} trials to run, {workers} workers x {threads} threads")
+
+    trial_args = {
+        "threads": threads,
+        "inter_op_threads": args.inter_op_threads,
+        "data_dir": args.data_dir,
+        "limit": args.limit,
+        "validation_limit": args.validation_limit,
+        "epochs": args.epochs,
+        "grace_epochs": args.grace_epochs,
+        "min_trials": args.min_trials,
+        "seed": args.seed,
+        "checkpoint_dir": args.checkpoint_dir,
+        "keep_checkpoints": args.keep_checkpoints,
+    }
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        core_queue = manager.Queue()
+        for cores in (core_sets(workers, threads) if not args.no_affinity else [[]] * workers):
+            core_queue.put(cores)
+        # One trial per process, so every trial starts TensorFlow with its own thread settings
+        with ProcessPoolExecutor(workers, mp_context=context, max_tasks_per_child=1) as pool:
+            futures = {pool.submit(run_trial, args.database, trial_id, trial_args, core_queue): trial_id
+                       for trial_id in trial_ids}
+            for future in as_completed(futures):
+                print(f"Trial {futures[future]}: {future.result()}")
+    report(args)
+
+
+def report(args):
+    engine = open_database(args.database)
+    with Session(engine) as session:
+        trials = session.scalars(select(SweepTrialModel).where(SweepTrialModel.sweep == args.name)).all()
+    engine.dispose()
+    # Best accuracy first; unfinished and failed trials go last
+    trials = sorted(trials, key=lambda trial: (trial.val_accuracy is None, -(trial.val_accuracy or 0), trial.id))
+    print(f"{'rank':>4} {'trial':>5} {'status':<8} {'val acc':>8} {'val loss':>8} {'epochs':>6} {'s/epoch':>8} "
+          f"{'total, s':>9} {'params':>11}  hyperparameters")
+    for rank, trial in enumerate(trials[:args.top], 1):
+        def number(value, spec):
+            return format(value, spec) if value is not None else "-"
+
+        params = ", ".join(f"{name}={value}" for name, value in sorted(trial.params.items()))
+        print(f"{rank:>4} {trial.id:>5} {trial.status:<8} {number(trial.val_accuracy, '.4f'):>8} "
+              f"{number(trial.val_loss, '.4f'):>8} {number(trial.epochs, 'd'):>6} "
+              f"{number(trial.seconds_per_epoch, '.1f'):>8} {number(trial.train_seconds, '.0f'):>9} "
+              f"{number(trial.parameters, ','):>11}  {params}")
+    counts = {status: sum(trial.status == status for trial in trials)
+              for status in ("complete", "pruned", "failed", "running", "pending")}
+    print(", ".join(f"{count} {status}" for status, count in counts.items() if count))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([{column.name: getattr(trial, column.name) for column in SweepTrialModel.__table__.columns}
+                       for trial in trials], f, indent=2, default=str)
+        print(f"Ranking written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLAlchemy URL of the results database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the trials of a sweep not finished yet")
+    run_parser.add_argument("--name", required=True, help="Sweep name; trials of the same name are ranked together")
+    run_parser.add_argument("--conv-filters", type=parse_ints, nargs="+", default=[CNN50_CONV_FILTERS])
+    run_parser.add_argument("--dense-units", type=parse_ints, nargs="+", default=[CNN50_DENSE_UNITS])
+    run_parser.add_argument("--dropout", type=parse_floats, nargs="+", default=[CNN50_DROPOUT])
+    run_parser.add_argument("--learning-rate", type=float, nargs="+", default=[0.001])
+    run_parser.add_argument("--batch-size", type=int, nargs="+", default=[32])
+    run_parser.add_argument("--patience", type=int, nargs="+", default=[10], help="0 disables early stopping")
+    run_parser.add_argument("--augment", nargs="+", choices=["off", "on"], default=["off"])
+    run_parser.add_argument("--trials", type=int, default=None, help="Random sample of the grid, default all of it")
+    run_parser.add_argument("--epochs", type=int, default=50)
+    run_parser.add_argument("--grace-epochs", type=int, default=3, help="Epochs before a trial can be pruned")
+    run_parser.add_argument("--min-trials", type=int, default=3,
+                            help="Trials to compare with before the median stopping rule applies")
+    run_parser.add_argument("--workers", type=int, default=None, help="Parallel trials")
+    run_parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per trial")
+    run_parser.add_argument("--inter-op-threads", type=int, default=1)
+    run_parser.add_argument("--no-affinity", action="store_true", help="Do not bind workers to their own cores")
+    run_parser.add_argument("--data-dir", default=DEFAULT_ROOT)
+    run_parser.add_argument("--limit", type=int, default=None, help="Use only the first N training images")
+    run_parser.add_argument("--validation-limit", type=int, default=None,
+                            help="Use only the first N test images for validation")
+    run_parser.add_argument("--checkpoint-dir", default="checkpoints/sweeps")
+    run_parser.add_argument("--keep-checkpoints", action="store_true", help="Keep best weights of finished trials")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--top", type=int, default=20, help="Trials in the final report")
+    run_parser.add_argument("--output", default=None, help="Also write the ranking as JSON")
+    run_parser.set_defaults(handler=run)
+
+    report_parser = subparsers.add_parser("report", help="Rank the trials of a sweep")
+    report_parser.add_argument("--name", required=True)
+    report_parser.add_argument("--top", type=int, default=20)
+    report_parser.add_argument("--output", default=None, help="Also write the ranking as JSON")
+    report_parser.set_defaults(handler=report)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Train the CNN_50 network through a tf.data pipeline, the scripted replacement
+of CNN_50.ipynb.
+
+Usage:
+    python -m src.neural_network.train
+    python -m src.neural_network.train --epochs 50 --augment --output CNN_50_epochs.h5
+    python -m src.neural_network.train --threads 8 --checkpoint-dir checkpoints/cnn50
+
+Images are read from the local dataset store (src.neural_network.dataset_store)
+and stay uint8 until a batch is formed: the dataset is cached, shuffled,
+optionally augmented in parallel map calls, normalized per batch and
+prefetched while the previous step runs. Model, optimizer state and epoch are
+backed up to the checkpoint directory after every epoch, and running the same
+command again resumes from there. The weights with the lowest validation loss
+are saved to --output, the file main.py loads, with a JSON report next to it.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.neural_network.architectures import (CNN50_CONV_FILTERS, CNN50_DENSE_UNITS, CNN50_DROPOUT,
+                                              build_cnn)
+from src.neural_network.dataset_store import DEFAULT_ROOT, array_dataset, load_splits
+
+AUTOTUNE = tf.data.AUTOTUNE
+# Pixels of reflected border added before the random crop back to 32x32
+AUGMENT_PADDING = 4
+
+
+def configure_threads(intra_op: int | None, inter_op: int | None):
+    """
+    Must run before the first TensorFlow operation.
+    """
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def load_cifar10(root: str = DEFAULT_ROOT, train_splits: tuple[str, ...] = ("train",)) \
+        -> tuple[tuple[np.ndarray, np.ndarray], tuple[np.ndarray, np.ndarray]]:
+    """
+    CIFAR-10 from the local dataset store, see src.neural_network.dataset_store.
+
+    :param train_splits: tuple: Splits joined into the training set, e.g. ("train", "uploads")
+    :return: ((train images, train labels), (test images, test labels)); memory-mapped uint8 RGB images
+    """
+    # RGB like keras.datasets; the "unit" serving preprocessing reverses the BGR channels of decoded uploads
+    return load_splits(list(train_splits), root), load_splits(["test"], root)
+
+
+def augment_image(image: tf.Tensor, seed: tf.Tensor) -> tf.Tensor:
+    """
+    Random horizontal flip and shift by up to AUGMENT_PADDING pixels. Stateless
+    ops with a seed per image keep the result independent of map parallelism.
+    """
+    flip_seed, crop_seed = tf.unstack(tf.random.experimental.stateless_split(seed, 2))
+    image = tf.image.stateless_random_flip_left_right(image, flip_seed)
+    padding = [[AUGMENT_PADDING, AUGMENT_PADDING], [AUGMENT_PADDING, AUGMENT_PADDING], [0, 0]]
+    image = tf.pad(image, padding, mode="REFLECT")
+    return tf.image.stateless_random_crop(image, tf.shape(image) - [2 * AUGMENT_PADDING, 2 * AUGMENT_PADDING, 0],
+                                          crop_seed)
+
+
+def normalize_batch(images: tf.Tensor, labels: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor]:
+    return tf.cast(images, tf.float32) / 255.0, labels
+
+
+def make_dataset(images: np.ndarray, labels: np.ndarray, batch_size: int, training: bool = False,
+                 augment: bool = False, seed: int = 0, cache: str | bool = True) -> tf.data.Dataset:
+    """
+    :param images: np.ndarray: uint8 images of shape (n, 32, 32, 3)
+    :param labels: np.ndarray: Class indices or, for distillation, rows of target probabilities
+    :param training: bool: Shuffle every epoch
+    :param augment: bool: Random flips and shifts, only with training
+    :param cache: str | bool: True to cache in memory, a path to cache on disk, False to read the source every epoch
+    :return: Batches of float32 images in [0, 1] with their labels
+    """
+    dataset = array_dataset(images, labels)
+    if cache:
+        dataset = dataset.cache(cache if isinstance(cache, str) else "")
+    if training:
+        dataset = dataset.shuffle(len(images), seed=seed, reshuffle_each_iteration=True)
+        if augment:
+            seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+            dataset = tf.data.Dataset.zip((dataset, seeds)).map(
+                lambda item, image_seed: (augment_image(item[0], image_seed), item[1]),
+                num_parallel_calls=AUTOTUNE,
+            )
+    return dataset.batch(batch_size).map(normalize_batch, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """
+    Adds the duration of every epoch to the logs, so it reaches the CSV log and the report.
+    """
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is not None:
+            logs["epoch_seconds"] = time.perf_counter() - self._started
+
+
+def read_log(path: str) -> list[dict]:
+    """
+    Rows of the CSV log, one per epoch; an epoch repeated after a resume keeps its latest row.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as f:
+        rows = {int(row["epoch"]): {key: float(value) for key, value in row.items() if value}
+                for row in csv.DictReader(f)}
+    return [rows[epoch] for epoch in sorted(rows)]
+
+
+def fit(model: tf.keras.Model, train_dataset: tf.data.Dataset, validation_dataset: tf.data.Dataset, epochs: int,
+        checkpoint_dir: str, patience: int | None = 10, extra_callbacks: list | None = None) -> list[dict]:
+    """
+    Fit a compiled model with resumable checkpoints and restore the weights with the lowest validation loss.
+
+    :param checkpoint_dir: str: Backup of the unfinished run, best weights and the per-epoch CSV log
+    :param patience: int: Epochs without improvement of validation loss before stopping, None to never stop early
+    :return: Metrics of every epoch, including epochs of earlier interrupted runs
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    backup_dir = os.path.join(checkpoint_dir, "backup")
+    best_path = os.path.join(checkpoint_dir, "best.weights.h5")
+    log_path = os.path.join(checkpoint_dir, "log.csv")
+    if not os.path.exists(backup_dir):
+        # Nothing to resume: results of a finished run must not leak into a new one
+        for path in (best_path, log_path):
+            if os.path.exists(path):
+                os.remove(path)
+    losses = [row["val_loss"] for row in read_log(log_path) if "val_loss" in row]
+
+    callbacks = [
+        EpochTimer(),
+        tf.keras.callbacks.BackupAndRestore(backup_dir),
+        tf.keras.callbacks.ModelCheckpoint(best_path, monitor="val_loss", save_best_only=True,
+                                           save_weights_only=True,
+                                           initial_value_threshold=min(losses) if losses else None),
+        tf.keras.callbacks.CSVLogger(log_path, append=True),
+        *(extra_callbacks or []),
+    ]
+    if patience is not None:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=patience))
+    # The dataset is already shuffled; shuffle=False only silences the Keras warning
+    model.fit(train_dataset, epochs=epochs, validation_data=validation_dataset, callbacks=callbacks, shuffle=False,
+              verbose=2)
+    if os.path.exists(best_path):
+        model.load_weights(best_path)
+    return read_log(log_path)
+
+
+def save_model(model: tf.keras.Model, path: str):
+    """
+    Write the file through a temporary name, so a running server never loads a half-written model.
+    """
+    root, extension = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{extension}"
+    model.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_report(path: str, report: dict):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def parse_ints(value: str) -> tuple[int, ...]:
+    return tuple(int(v) for v in value.split(","))
+
+
+def parse_floats(value: str) -> tuple[float, ...]:
+    return tuple(float(v) for v in value.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="CNN_50_epochs.h5")
+    parser.add_argument("--checkpoint-dir", default="checkpoints/cnn50")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--patience", type=int, default=10, help="0 disables early stopping")
+    parser.add_argument("--augment", action="store_true", help="Random flips and shifts of training images")
+    parser.add_argument("--conv-filters", type=parse_ints, default=CNN50_CONV_FILTERS)
+    parser.add_argument("--dense-units", type=parse_ints, default=CNN50_DENSE_UNITS)
+    parser.add_argument("--dropout", type=parse_floats, default=CNN50_DROPOUT)
+    parser.add_argument("--data-dir", default=DEFAULT_ROOT)
+    parser.add_argument("--train-splits", default="train", help='Dataset store splits, e.g. "train,uploads"')
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N training images")
+    parser.add_argument("--cache-file", default=None, help="Cache the dataset on disk instead of in memory")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--deterministic", action="store_true", help="Deterministic ops, slower")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads")
+    parser.add_argument("--inter-op-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    configure_threads(args.threads, args.inter_op_threads)
+    tf.keras.utils.set_random_seed(args.seed)
+    if args.deterministic:
+        tf.config.experimental.enable_op_determinism()
+
+    (x_train, y_train), (x_test, y_test) = load_cifar10(args.data_dir, tuple(args.train_splits.split(",")))
+    x_train, y_train = x_train[:args.limit], y_train[:args.limit]
+    # As in the notebook, the test split doubles as validation data
+    train_dataset = make_dataset(x_train, y_train, args.batch_size, training=True, augment=args.augment,
+                                 seed=args.seed, cache=args.cache_file or True)
+    test_dataset = make_dataset(x_test, y_test, args.batch_size)
+
+    model = build_cnn(args.conv_filters, args.dense_units, args.dropout)
+    model.compile(loss="sparse_categorical_crossentropy", optimizer=tf.keras.optimizers.Adam(args.learning_rate),
+                  metrics=["accuracy"])
+    started = time.perf_counter()
+    history = fit(model, train_dataset, test_dataset, args.epochs, args.checkpoint_dir, args.patience or None)
+    train_seconds = time.perf_counter() - started
+    test_loss, test_accuracy = model.evaluate(test_dataset, verbose=0)
+    print(f"Accuracy: {test_accuracy:.4f}")
+
+    save_model(model, args.output)
+    report_path = f"{os.path.splitext(args.output)[0]}.json"
+    write_report(report_path, {
+        "model": args.output,
+        "arguments": vars(args),
+        "tensorflow": tf.__version__,
+        "parameters": model.count_params(),
+        "epochs": len(history),
+        "train_seconds_this_run": train_seconds,
+        "test_loss": test_loss,
+        "test_accuracy": test_accuracy,
+        "history": history,
+    })
+    print(f"Model written to {args.output}, report to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Train the ResNet50.ipynb classifier head on cached backbone features.
+
+Usage:
+    python -m src.neural_network.train_resnet50_head
+    python -m src.neural_network.train_resnet50_head --epochs 50 --output ResNet50_model.keras
+
+The frozen backbone (7x upsampling and ImageNet ResNet50 up to global average
+pooling) runs once over the training and test splits; its pooled features
+are stored in --feature-dir and reused by every later run. Only the dense
+head trains, on batches read from the memory-mapped features, so an epoch
+takes seconds instead of a full backbone pass. The head is then put back on
+the backbone and saved to --output; serve it with the "resnet50" input
+preprocessing.
+"""
+import argparse
+import os
+import time
+
+import tensorflow as tf
+
+from src.neural_network.architectures import (RESNET50_HEAD_UNITS, assemble_resnet50, build_resnet50_backbone,
+                                              build_resnet50_head)
+from src.neural_network.dataset_store import DEFAULT_ROOT
+from src.neural_network.feature_cache import backbone_identity, extract_features, feature_batches
+from src.neural_network.train import configure_threads, fit, load_cifar10, parse_ints, save_model, write_report
+
+
+def load_backbone_features(data_dir: str, feature_dir: str, weights: str | None, batch_size: int,
+                           limit: int | None):
+    """
+    :return: (backbone, ((train features, labels), (test features, labels)), extraction seconds of this run)
+    """
+    (x_train, y_train), (x_test, y_test) = load_cifar10(data_dir)
+    backbone = build_resnet50_backbone(weights)
+    identity = backbone_identity(backbone)
+    preprocess = tf.keras.applications.resnet50.preprocess_input
+    started = time.perf_counter()
+    splits = tuple(
+        extract_features(backbone, preprocess, images[:limit], labels[:limit], feature_dir, split, identity, batch_size)
+        for split, images, labels in (("train", x_train, y_train), ("test", x_test, y_test))
+    )
+    return backbone, splits, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="ResNet50_model.keras")
+    parser.add_argument("--data-dir", default=DEFAULT_ROOT)
+    parser.add_argument("--feature-dir", default="features/resnet50")
+    parser.add_argument("--checkpoint-dir", default="checkpoints/resnet50_head")
+    parser.add_argument("--weights", default="imagenet", help='Backbone weights, "none" for random initialization')
+    parser.add_argument("--extract-batch-size", type=int, default=32,
+                        help="Images per backbone pass; activations at 224x224 take ~50 MB per image")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--patience", type=int, default=5, help="0 disables early stopping")
+    parser.add_argument("--head-units", type=parse_ints, default=RESNET50_HEAD_UNITS)
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N images of each split")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads")
+    parser.add_argument("--inter-op-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    configure_threads(args.threads, args.inter_op_threads)
+    tf.keras.utils.set_random_seed(args.seed)
+    weights = None if args.weights == "none" else args.weights
+
+    backbone, ((train_features, train_labels), (test_features, test_labels)), extract_seconds = \
+        load_backbone_features(args.data_dir, args.feature_dir, weights, args.extract_batch_size, args.limit)
+    print(f"Features ready in {extract_seconds:.1f}s: train {train_features.shape}, test {test_features.shape}")
+
+    head = build_resnet50_head(train_features.shape[1], args.head_units)
+    head.compile(loss="sparse_categorical_crossentropy", optimizer=tf.keras.optimizers.Adam(args.learning_rate),
+                 metrics=["accuracy"])
+    test_dataset = feature_batches(test_features, test_labels, args.batch_size)
+    history = fit(head, feature_batches(train_features, train_labels, args.batch_size, training=True, seed=args.seed),
+                  test_dataset, args.epochs, args.checkpoint_dir, args.patience or None)
+    test_loss, test_accuracy = head.evaluate(test_dataset, verbose=0)
+    print(f"Accuracy: {test_accuracy:.4f}")
+
+    save_model(assemble_resnet50(backbone, head), args.output)
+    report_path = f"{os.path.splitext(args.output)[0]}.json"
+    write_report(report_path, {
+        "model": args.output,
+        "arguments": vars(args),
+        "tensorflow": tf.__version__,
+        "parameters": {"backbone": backbone.count_params(), "head": head.count_params()},
+        "extract_seconds_this_run": extract_seconds,
+        "epochs": len(history),
+        "test_loss": test_loss,
+        "test_accuracy": test_accuracy,
+        "history": history,
+    })
+    print(f"Model written to {args.output}, report to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.predictions import PredictionModel
+
+
+class PredictionRepo:
+
+    def __init__(self, db):
+        self.db: AsyncSession = db
+
+    async def add_many(self, rows: list[dict]):
+        # One executemany INSERT for the whole batch
+        await self.db.execute(insert(PredictionModel), rows)
+        await self.db.commit()
+
+    async def find(self, predicted_class: str | None, since: datetime | None, until: datetime | None,
+                   min_probability: float | None, max_probability: float | None,
+                   before: tuple[datetime, int] | None, limit: int) -> list[PredictionModel]:
+        """
+        Newest first. before is (created_at, id) of the last row of the previous page.
+        """
+        stmt = select(PredictionModel)
+        if predicted_class is not None:
+            stmt = stmt.filter(PredictionModel.predicted_class == predicted_class)
+        if since is not None:
+            stmt = stmt.filter(PredictionModel.created_at >= since)
+        if until is not None:
+            stmt = stmt.filter(PredictionModel.created_at < until)
+        if min_probability is not None:
+            stmt = stmt.filter(PredictionModel.probability >= min_probability)
+        if max_probability is not None:
+            stmt = stmt.filter(PredictionModel.probability <= max_probability)
+        if before is not None:
+            stmt = stmt.filter(tuple_(PredictionModel.created_at, PredictionModel.id) < tuple_(*before))
+        stmt = stmt.order_by(PredictionModel.created_at.desc(), PredictionModel.id.desc()).limit(limit)
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
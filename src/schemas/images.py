@@ -0,0 +1,14 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class UploadedImageSchema(BaseModel):
+    filename: str
+    size: int
+    uploaded_at: float
+
+
+class UploadedImagePageSchema(BaseModel):
+    items: list[UploadedImageSchema]
+    next_cursor: Optional[int] = None
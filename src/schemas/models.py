@@ -0,0 +1,18 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class ModelLoadSchema(BaseModel):
+    name: str = Field(min_length=1, max_length=64)
+    path: str
+    preprocessing: str = Field("unit", pattern="^(unit|resnet50)$")
+
+
+class DefaultModelSchema(BaseModel):
+    name: str
+
+
+class CandidateModelSchema(BaseModel):
+    name: Optional[str] = None
+    share: float = Field(0.0, ge=0.0, le=1.0)
@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ClassProbabilitySchema(BaseModel):
+    label: str
+    probability: float
+
+
+class FilePredictionSchema(BaseModel):
+    filename: str
+    # Model that answered, in cascade mode
+    model: Optional[str] = None
+    top_k: Optional[list[ClassProbabilitySchema]] = None
+    error: Optional[str] = None
+
+
+class PredictionResponseSchema(BaseModel):
+    model: str
+    top_k: list[ClassProbabilitySchema]
+    probabilities: Optional[dict[str, float]] = None
+
+
+class BatchPredictionResponseSchema(BaseModel):
+    model: str
+    results: list[FilePredictionSchema]
+
+
+class PredictionHistoryItemSchema(BaseModel):
+    id: int
+    content_hash: str
+    filename: Optional[str] = None
+    model: str
+    predicted_class: str
+    probability: float
+    top_k: list[ClassProbabilitySchema]
+    latency_ms: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class PredictionHistoryPageSchema(BaseModel):
+    items: list[PredictionHistoryItemSchema]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from typing import Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ["keras", "tflite"]
+QUANTIZATIONS = ["none", "float16", "int8"]
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # model.predict builds a tf.data pipeline on every call, about 130 ms on CPU
+        # whatever the batch size; a single batch needs none of it
+        return self.model.predict_on_batch(batch)
+
+
+class TFLiteBackend:
+    """
+    Runs a converted model through the TFLite interpreter. The interpreter
+    is not thread safe and keeps one input shape, so calls are serialized
+    and the input is resized only when the batch size changes.
+    """
+    name = "tflite"
+
+    def __init__(self, model_content: bytes, quantization: str = "none", num_threads: int | None = None):
+        import tensorflow as tf
+
+        self.quantization = quantization
+        self.interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+def cifar10_calibration_images(count: int = 256, root: str | None = None, preprocessing: str = "unit") -> np.ndarray:
+    """
+    Training images from the local dataset store, or from the Keras download when it was not imported,
+    given to the model the way it is served: BGR as decoded, then the model's input preprocessing.
+    """
+    from src.neural_network.dataset_store import DEFAULT_ROOT, load_splits
+    from src.services.inference import INPUT_PREPROCESSING
+
+    try:
+        x_train, _ = load_splits(["train"], root or DEFAULT_ROOT)
+    except FileNotFoundError:
+        import tensorflow as tf
+
+        (x_train, _), _ = tf.keras.datasets.cifar10.load_data()
+    return INPUT_PREPROCESSING[preprocessing](x_train[:count, ..., ::-1].astype("float32") / 255.0)
+
+
+def convert_to_tflite(model, quantization: str = "none", calibration_images: Iterable[np.ndarray] | None = None) -> bytes:
+    """
+    Convert a loaded Keras model to a TFLite flatbuffer with optional post-training quantization.
+
+    :param model: Keras model
+    :param quantization: str: "none", "float16" (half precision weights) or "int8"
+        (weights and activations, calibrated on calibration_images)
+    :param calibration_images: Iterable of float32 images of shape (32, 32, 3) for int8 calibration
+    :return: Serialized TFLite model
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if calibration_images is None:
+            calibration_images = cifar10_calibration_images()
+
+        def representative_dataset():
+            for img in calibration_images:
+                yield [np.expand_dims(img, 0).astype("float32")]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+    return converter.convert()
+
+
+def tflite_path(model_path: str, quantization: str, preprocessing: str = "unit") -> str:
+    # int8 ranges are calibrated on preprocessed input, so the preprocessing is part of the artifact
+    if quantization == "int8":
+        quantization = f"int8-{preprocessing}"
+    return f"{os.path.splitext(model_path)[0]}.{quantization}.tflite"
+
+
+def load_backend(model_path: str, backend: str = "keras", quantization: str = "none", num_threads: int | None = None,
+                 preprocessing: str = "unit"):
+    """
+    Load the model at model_path and wrap it in the requested backend.
+    Converted TFLite models are cached next to the source model and reused
+    while they are newer than it. int8 models are calibrated with the input
+    preprocessing the model is served with.
+    """
+    import tensorflow as tf
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    if backend == "keras":
+        return KerasBackend(tf.keras.models.load_model(model_path))
+
+    cached_path = tflite_path(model_path, quantization, preprocessing)
+    if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= os.path.getmtime(model_path):
+        with open(cached_path, "rb") as f:
+            model_content = f.read()
+        logger.info(f"Loaded TFLite model from {cached_path}")
+    else:
+        calibration_images = (cifar10_calibration_images(preprocessing=preprocessing)
+                              if quantization == "int8" else None)
+        model_content = convert_to_tflite(tf.keras.models.load_model(model_path), quantization, calibration_images)
+        # Process workers may convert at the same time: write atomically
+        tmp_path = f"{cached_path}.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(model_content)
+        os.replace(tmp_path, cached_path)
+        logger.info(f"Converted {model_path} to TFLite ({quantization}), saved to {cached_path}")
+    return TFLiteBackend(model_content, quantization, num_threads)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+
+import numpy as np
+
+from src.services import metrics
+from src.services.executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+async def collect_batch(queue: asyncio.Queue, max_size: int, max_wait: float) -> tuple[list, bool]:
+    """
+    Wait for the first queued item, then keep taking items until max_size is
+    reached or max_wait seconds have passed since the first one. A None item
+    is a stop request and ends the batch.
+
+    :param queue: asyncio.Queue: queue to take items from
+    :param max_size: int: largest batch to return
+    :param max_wait: float: seconds to wait for more items after the first
+    :return: (items, True if a stop request was taken)
+    """
+    item = await queue.get()
+    if item is None:
+        return [], True
+    batch = [item]
+    deadline = time.perf_counter() + max_wait
+    while len(batch) < max_size:
+        timeout = deadline - time.perf_counter()
+        if timeout <= 0:
+            break
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+    # Take whatever is already waiting without extending the window
+    while len(batch) < max_size and not queue.empty():
+        item = queue.get_nowait()
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+class InferenceBatcher:
+    """
+    Collects images from concurrent requests into a single batch and runs
+    one forward pass for all of them. Each caller gets back its own row
+    of the predictions array.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], max_batch_size: int, max_wait_ms: float,
+                 executor: InferenceExecutor | None = None, name: str = ""):
+        self.predict_fn = predict_fn
+        self.name = name
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def predict(self, img: np.ndarray) -> np.ndarray:
+        """
+        Queue a single preprocessed image (without the batch axis) and wait for its predictions.
+
+        :param img: np.ndarray: Image of shape (height, width, channels)
+        :return: Predictions row for this image
+        """
+        if self._worker is None:
+            raise RuntimeError("InferenceBatcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((img, future, time.perf_counter()))
+        return await future
+
+    async def _forward(self, images: np.ndarray) -> np.ndarray:
+        if self.executor is not None:
+            return await self.executor.run(self.predict_fn, images)
+        return await asyncio.to_thread(self.predict_fn, images)
+
+    async def _run(self):
+        while True:
+            batch, _ = await collect_batch(self._queue, self.max_batch_size, self.max_wait)
+            images = np.stack([img for img, _, _ in batch])
+            started = time.perf_counter()
+            waited_ms = (started - batch[0][2]) * 1000
+            try:
+                predictions = await self._forward(images)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            predict_s = time.perf_counter() - started
+            metrics.PREDICT_SECONDS.labels(self.name).observe(predict_s)
+            metrics.BATCH_SIZE.labels(self.name).observe(len(batch))
+            logger.info(
+                f"Inference batch: size={len(batch)} waited={waited_ms:.1f}ms "
+                f"predict={predict_s * 1000:.1f}ms"
+            )
+            for row, (_, future, _) in zip(predictions, batch):
+                if not future.done():
+                    future.set_result(row)
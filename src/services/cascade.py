@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+
+from src.services.model_registry import ModelRegistry, ModelStats
+
+
+class ModelCascade:
+    """
+    Confidence cascade over two registered models: every image goes through
+    the fast model first and is escalated to the heavy one only when the top-1
+    probability or the margin to the second class is below the threshold.
+    Escalated images go through the heavy model's own micro-batcher, so they
+    are batched together and never slow down the fast path. A batch request
+    runs all its images through the fast model, then the uncertain ones
+    through the heavy model in batches.
+    """
+
+    name = "cascade"
+
+    def __init__(self, registry: ModelRegistry, fast: str, heavy: str,
+                 min_probability: float, min_margin: float):
+        self.registry = registry
+        self.fast = fast
+        self.heavy = heavy
+        self.min_probability = min_probability
+        self.min_margin = min_margin
+        # End-to-end latency of all images, of the ones answered by the fast
+        # model and of the escalated ones
+        self.stats = ModelStats()
+        self.fast_stats = ModelStats()
+        self.escalated_stats = ModelStats()
+
+    def should_escalate(self, predictions: np.ndarray) -> bool:
+        second, first = np.sort(predictions)[-2:]
+        return first < self.min_probability or first - second < self.min_margin
+
+    async def classify(self, img_bytes: bytes, cache_key: str) -> tuple[str, np.ndarray, np.ndarray | None]:
+        """
+        :return: (name of the model that answered, class probabilities, decoded input or None)
+        """
+        started = time.perf_counter()
+        with self.registry.use(self.fast) as fast, self.registry.use(self.heavy) as heavy:
+            predictions, img = await self.registry.classify(fast, img_bytes, cache_key)
+            escalated = self.should_escalate(predictions)
+            if escalated:
+                predictions, img = await self.registry.classify(heavy, img_bytes, cache_key, img)
+        elapsed = time.perf_counter() - started
+        self.stats.record(elapsed)
+        (self.escalated_stats if escalated else self.fast_stats).record(elapsed)
+        return (heavy if escalated else fast).name, predictions, img
+
+    async def classify_many(self, contents: list[bytes], keys: list[str],
+                            decoded: dict) -> tuple[list[str | None], list[np.ndarray | None]]:
+        """
+        ModelRegistry.classify_many through the cascade.
+
+        :return: (name of the model that answered each file, class probabilities or None if not decodable)
+        """
+        started = time.perf_counter()
+        with self.registry.use(self.fast) as fast, self.registry.use(self.heavy) as heavy:
+            rows = await self.registry.classify_many(fast, contents, keys, decoded)
+            names = [fast.name if row is not None else None for row in rows]
+            escalated = [i for i, row in enumerate(rows) if row is not None and self.should_escalate(row)]
+            if escalated:
+                heavy_rows = await self.registry.classify_many(
+                    heavy, [contents[i] for i in escalated], [keys[i] for i in escalated], decoded
+                )
+                for i, row in zip(escalated, heavy_rows):
+                    rows[i], names[i] = row, heavy.name
+        elapsed = time.perf_counter() - started
+        answered = sum(row is not None for row in rows)
+        if answered:
+            self.stats.record(elapsed, images=answered)
+        if answered > len(escalated):
+            self.fast_stats.record(elapsed, images=answered - len(escalated))
+        if escalated:
+            self.escalated_stats.record(elapsed, images=len(escalated))
+        return names, rows
+
+    def describe(self) -> dict:
+        images = self.stats.images
+        return {
+            "fast_model": self.fast,
+            "heavy_model": self.heavy,
+            "min_probability": self.min_probability,
+            "min_margin": self.min_margin,
+            "escalated": self.escalated_stats.images,
+            "escalation_rate": self.escalated_stats.images / images if images else 0.0,
+            "latency": {
+                "all": self.stats.snapshot(),
+                "fast_only": self.fast_stats.snapshot(),
+                "escalated": self.escalated_stats.snapshot(),
+            },
+        }
@@ -0,0 +1,99 @@
+import asyncio
+import contextlib
+import time
+
+import numpy as np
+
+from src.services.model_registry import ModelEntry, ModelRegistry, ModelStats
+
+
+class ModelEnsemble:
+    """
+    Weighted average of class probabilities of several registered models.
+    An image is decoded once and the same input goes to all members
+    concurrently, each through its own micro-batcher; members that already
+    have the image in their prediction cache are skipped. A batch request
+    goes to all members concurrently in batches.
+    """
+
+    name = "ensemble"
+
+    def __init__(self, registry: ModelRegistry, weights: dict[str, float]):
+        self.registry = registry
+        self.weights = weights
+        self.stats = ModelStats()
+        # Per member: how often its top-1 class matches the ensemble answer and
+        # the total probability it gave to that answer
+        self._agreements = {name: 0 for name in weights}
+        self._answer_probability = {name: 0.0 for name in weights}
+        self._answers = 0
+
+    @contextlib.contextmanager
+    def use(self):
+        """
+        Pin every member model for the duration of one request.
+        """
+        with contextlib.ExitStack() as stack:
+            yield [stack.enter_context(self.registry.use(name)) for name in self.weights]
+
+    def combine(self, entries: list[ModelEntry], member_predictions: list[np.ndarray]) -> np.ndarray:
+        weights = np.array([self.weights[entry.name] for entry in entries], dtype=np.float32)
+        predictions = np.tensordot(weights / weights.sum(), np.stack(member_predictions), axes=1)
+        answer = int(np.argmax(predictions))
+        self._answers += 1
+        for entry, row in zip(entries, member_predictions):
+            self._agreements[entry.name] += int(np.argmax(row)) == answer
+            self._answer_probability[entry.name] += float(row[answer])
+        return predictions
+
+    async def _predict_member(self, entry: ModelEntry, img: np.ndarray, cache_key: str) -> np.ndarray:
+        predictions = await self.registry.predict(entry, img)
+        entry.cache.put(cache_key, predictions)
+        return predictions
+
+    async def classify(self, img_bytes: bytes, cache_key: str) -> tuple[str, np.ndarray, np.ndarray | None]:
+        """
+        :return: (ensemble name, combined class probabilities, decoded input or None if all members hit the cache)
+        """
+        started = time.perf_counter()
+        with self.use() as entries:
+            member_predictions = [await entry.cache.get(cache_key) for entry in entries]
+            missing = [i for i, row in enumerate(member_predictions) if row is None]
+            img = None
+            if missing:
+                img = await self.registry.decode(img_bytes)
+                rows = await asyncio.gather(*(self._predict_member(entries[i], img, cache_key) for i in missing))
+                for i, row in zip(missing, rows):
+                    member_predictions[i] = row
+            predictions = self.combine(entries, member_predictions)
+        self.stats.record(time.perf_counter() - started)
+        return self.name, predictions, img
+
+    async def classify_many(self, contents: list[bytes], keys: list[str], decoded: dict) -> list[np.ndarray | None]:
+        """
+        ModelRegistry.classify_many through every member, combined per file.
+
+        :return: Combined class probabilities per file, None for files that could not be decoded
+        """
+        started = time.perf_counter()
+        with self.use() as entries:
+            member_rows = await asyncio.gather(
+                *(self.registry.classify_many(entry, contents, keys, decoded) for entry in entries)
+            )
+            rows = [None if any(member[i] is None for member in member_rows)
+                    else self.combine(entries, [member[i] for member in member_rows])
+                    for i in range(len(contents))]
+        self.stats.record(time.perf_counter() - started, images=len(contents))
+        return rows
+
+    def describe(self) -> dict:
+        members = {}
+        for name, weight in self.weights.items():
+            entry = self.registry.models.get(name)
+            members[name] = {
+                "weight": weight,
+                "agreement_rate": self._agreements[name] / self._answers if self._answers else 0.0,
+                "mean_answer_probability": self._answer_probability[name] / self._answers if self._answers else 0.0,
+                "stats": entry.stats.snapshot() if entry is not None else None,
+            }
+        return {"answers": self._answers, "latency": self.stats.snapshot(), "members": members}
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+
+
+class InferenceQueueFull(Exception):
+    pass
+
+
+class InferenceExecutor:
+    """
+    Dedicated pool for CPU-bound work (decode, predict, save) so it never
+    runs on the event loop. Admission is bounded: at most workers + queue_size
+    requests are in flight, further requests are rejected immediately.
+    """
+
+    def __init__(self, kind: str, workers: int, queue_size: int,
+                 initializer: Callable | None = None, initargs: tuple = ()):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self.in_flight = 0
+        self._initializer = initializer
+        self._initargs = initargs
+        self._pool: Executor | None = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.kind == "process":
+            # spawn: workers must not inherit TensorFlow state from the parent
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+                initargs=self._initargs,
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @contextlib.contextmanager
+    def admit(self):
+        """
+        Reserve a slot for one request for the duration of the with block.
+
+        :raises InferenceQueueFull: when all workers are busy and the queue is full
+        """
+        if self.in_flight >= self.capacity:
+            raise InferenceQueueFull()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn: Callable, *args):
+        if self._pool is None:
+            raise RuntimeError("InferenceExecutor is not started")
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def run_on_every_worker(self, fn: Callable, *args):
+        """
+        Run fn in every worker process, e.g. to load a model into each of them.
+        Work is handed to whichever worker is free, so rounds are repeated until
+        every worker has answered; fn must therefore be idempotent.
+        In thread mode the workers share memory and fn runs once, outside the pool.
+        """
+        if self.kind != "process":
+            await asyncio.to_thread(fn, *args)
+            return
+        pids = set()
+        while len(pids) < self.workers:
+            pids.update(await asyncio.gather(*(self.run(_call_in_worker, fn, args) for _ in range(self.workers))))
+
+
+def _call_in_worker(fn: Callable, args: tuple) -> int:
+    fn(*args)
+    return os.getpid()
@@ -0,0 +1,123 @@
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+from fastapi import Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat: os.stat_result) -> str:
+    # Files are only ever replaced as a whole, which changes size or mtime
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def content_etag(content: bytes) -> str:
+    return f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range Range header.
+
+    :return: (first byte, last byte inclusive), None to send the whole body
+    :raises ValueError: when the range cannot be satisfied
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if match is None:
+        # Missing, multi-range or other units: the full body is a valid answer
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise ValueError("Range not satisfiable")
+    return first, last
+
+
+def _conditional(request: Request, etag: str, size: int, headers: dict) -> Response | tuple[int, int] | None:
+    """
+    Shared handling of If-None-Match, If-Range and Range.
+
+    :return: a finished response (304 or 416), a byte range to send, or None for the full body
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return None
+    try:
+        return parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"},
+        )
+
+
+def cached_file_response(request: Request, path: str, cache_control: str, media_type: str | None = None) -> Response:
+    """
+    FileResponse with a strong ETag and Cache-Control that answers conditional
+    requests with 304 and Range requests with 206.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    result = _conditional(request, etag, stat.st_size, headers)
+    if isinstance(result, Response):
+        return result
+    if result is None:
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+    first, last = result
+
+    def read_range():
+        with open(path, "rb") as f:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(read_range(), status_code=status.HTTP_206_PARTIAL_CONTENT, headers={
+        **headers,
+        "Content-Range": f"bytes {first}-{last}/{stat.st_size}",
+        "Content-Length": str(last - first + 1),
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }, media_type=media_type or mimetypes.guess_type(path)[0] or "application/octet-stream")
+
+
+def cached_bytes_response(request: Request, content: bytes, media_type: str, cache_control: str) -> Response:
+    """
+    The same conditional and Range handling for a body built in memory.
+    """
+    etag = content_etag(content)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    result = _conditional(request, etag, len(content), headers)
+    if isinstance(result, Response):
+        return result
+    if result is None:
+        return Response(content=content, media_type=media_type, headers=headers)
+    first, last = result
+    return Response(content=content[first:last + 1], status_code=status.HTTP_206_PARTIAL_CONTENT,
+                    media_type=media_type, headers={**headers, "Content-Range": f"bytes {first}-{last}/{len(content)}"})
@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.services.backends import load_backend
+from src.services.preprocessing import IMAGE_SIZE
+
+CLASSES = ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
+
+# Channel means subtracted by keras.applications.resnet50.preprocess_input
+# ("caffe" mode, BGR order). decode_image already returns BGR.
+RESNET50_BGR_MEAN = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+# decode_image yields BGR values in [0, 1] (OpenCV order); every model declares
+# how it expects its input on top of that. "unit" models (CNN_50, distilled
+# students) are trained on the RGB arrays of CIFAR-10, so the channels are
+# reversed for them
+INPUT_PREPROCESSING = {
+    "unit": lambda batch: batch[..., ::-1],
+    "resnet50": lambda batch: batch * 255.0 - RESNET50_BGR_MEAN,
+}
+
+# Models loaded in the current process by name. With the process executor
+# every worker holds its own copies, loaded through run_on_every_worker.
+_models: dict[str, tuple[object, str, str]] = {}
+
+
+def load_model(name: str, model_path: str, preprocessing: str = "unit", backend: str = "keras",
+               quantization: str = "none", num_threads: int | None = None,
+               warmup_batch_sizes: tuple[int, ...] = ()):
+    """
+    Load a model into this process under name and run a dummy batch of every warm-up size,
+    so graph tracing and memory allocation do not happen on a user request.
+    Loading the same path under the same name again is a no-op.
+    """
+    if preprocessing not in INPUT_PREPROCESSING:
+        raise ValueError(f"Unknown input preprocessing: {preprocessing}")
+    loaded = _models.get(name)
+    if loaded is not None and loaded[1] == model_path:
+        return loaded[0]
+    model = load_backend(model_path, backend, quantization, num_threads, preprocessing)
+    for batch_size in warmup_batch_sizes:
+        model.predict(INPUT_PREPROCESSING[preprocessing](np.zeros((batch_size, *IMAGE_SIZE, 3), dtype=np.float32)))
+    _models[name] = (model, model_path, preprocessing)
+    return model
+
+
+def unload_model(name: str):
+    _models.pop(name, None)
+
+
+def predict_model(name: str, batch: np.ndarray) -> np.ndarray:
+    loaded = _models.get(name)
+    if loaded is None:
+        raise RuntimeError(f"Model {name} is not loaded")
+    model, _, preprocessing = loaded
+    return model.predict(INPUT_PREPROCESSING[preprocessing](batch))
+
+
+def top_k(predictions: np.ndarray, classes: list[str], k: int) -> list[dict]:
+    indices = np.argsort(predictions)[::-1][:k]
+    return [{"label": classes[i], "probability": float(predictions[i])} for i in indices]
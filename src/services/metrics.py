@@ -0,0 +1,212 @@
+"""
+Minimal Prometheus metrics that are cheap enough to stay on in the hot path.
+
+Every thread writes to its own shard of counters (a plain list), so recording
+an observation takes no lock: a bisect and two increments. Shards are summed
+only when /metrics is scraped. Gauges are callbacks evaluated at scrape time.
+"""
+import bisect
+import os
+import resource
+import threading
+from typing import Callable
+
+# Seconds, from sub-millisecond decodes of small images to multi-second batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _ShardedValues:
+    """
+    A fixed-size list of numbers per thread; only the owning thread writes to it.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards: list[list[float]] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> list[float]:
+        values = getattr(self._local, "values", None)
+        if values is None:
+            values = [0] * self.size
+            with self._lock:
+                self._shards.append(values)
+            self._local.values = values
+        return values
+
+    def total(self) -> list[float]:
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(column) for column in zip(*shards)] if shards else [0] * self.size
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    def __init__(self):
+        self._values = _ShardedValues(1)
+
+    def inc(self, amount: float = 1):
+        self._values.shard()[0] += amount
+
+    def value(self) -> float:
+        return self._values.total()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {child.value()}")
+        return lines
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # One count per bucket, one for +Inf, then the sum
+        self._values = _ShardedValues(len(buckets) + 2)
+
+    def observe(self, value: float):
+        values = self._values.shard()
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            totals = child._values.total()
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), totals[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {totals[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Value read from a callback at scrape time; the callback returns a number,
+    or a dict of label values (tuples) to numbers for a labelled gauge.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: tuple[str, ...] = ()):
+        self.callback = callback
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        value = self.callback()
+        if isinstance(value, dict):
+            for values, number in value.items():
+                lines.append(f"{self.name}{_labels(self.labelnames, values)} {number}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak instead of current RSS where /proc is not available (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+registry = MetricsRegistry()
+
+UPLOAD_READ_SECONDS = registry.register(Histogram(
+    "inference_upload_read_seconds", "Time to receive and store the uploaded file", ("endpoint",)))
+DECODE_SECONDS = registry.register(Histogram(
+    "inference_decode_seconds", "Time to decode the uploaded image"))
+RESIZE_SECONDS = registry.register(Histogram(
+    "inference_resize_seconds", "Time to resize the decoded image to the model input"))
+PREDICT_SECONDS = registry.register(Histogram(
+    "inference_predict_seconds", "Time of one model forward pass over a batch", ("model",)))
+BATCH_SIZE = registry.register(Histogram(
+    "inference_batch_size", "Images per model forward pass", ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+SAVE_SECONDS = registry.register(Histogram(
+    "inference_save_seconds", "Time to append a batch of processed images to the store"))
+PREDICTIONS = registry.register(Counter(
+    "inference_predictions_total", "Predictions by model and predicted class", ("model", "class")))
@@ -0,0 +1,277 @@
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import time
+from collections import deque
+from functools import partial
+
+import numpy as np
+
+from src.services import inference, metrics
+from src.services.batcher import InferenceBatcher
+from src.services.executor import InferenceExecutor
+from src.services.prediction_cache import PredictionCache
+from src.services.preprocessing import decode_image_timed
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoadFailed(Exception):
+    pass
+
+
+class ModelStats:
+    """
+    Counters and a sliding window of recent latencies for one model.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.requests = 0
+        self.images = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, seconds: float, images: int = 1):
+        self.requests += 1
+        self.images += images
+        self._latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+        result = {"requests": self.requests, "images": self.images, "errors": self.errors}
+        if self._latencies:
+            latencies_ms = np.array(self._latencies) * 1000
+            p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+            result.update({
+                "latency_ms_mean": float(latencies_ms.mean()),
+                "latency_ms_p50": float(p50),
+                "latency_ms_p95": float(p95),
+                "latency_ms_p99": float(p99),
+            })
+        return result
+
+
+class ModelEntry:
+    def __init__(self, name: str, worker_name: str, path: str, preprocessing: str,
+                 batcher: InferenceBatcher, cache: PredictionCache):
+        self.name = name
+        # Name of this copy inside the inference workers, unique per load
+        self.worker_name = worker_name
+        self.path = path
+        self.preprocessing = preprocessing
+        self.batcher = batcher
+        self.cache = cache
+        self.stats = ModelStats()
+        self.loaded_at = time.time()
+        self.in_use = 0
+        self.retired = False
+
+
+class ModelRegistry:
+    """
+    Named models served side by side. Requests pick a model once through
+    use() and keep that entry until they finish, so switching the default
+    model, changing the candidate share or reloading a model never affects
+    requests already in flight: a replaced model is unloaded only after its
+    last request is done. Every model has its own micro-batcher and
+    prediction cache.
+    """
+
+    def __init__(self, executor: InferenceExecutor, backend: str, quantization: str, num_threads: int | None,
+                 warmup_batch_sizes: list[int], max_batch_size: int, max_wait_ms: float,
+                 cache_size: int, cache_dir: str | None, cache_disk_items: int = 100_000):
+        self.executor = executor
+        self.backend = backend
+        self.quantization = quantization
+        self.num_threads = num_threads
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.cache_disk_items = cache_disk_items
+        self.models: dict[str, ModelEntry] = {}
+        self.default: str | None = None
+        self.candidate: str | None = None
+        self.candidate_share = 0.0
+
+    def model_identity(self, path: str, preprocessing: str) -> str:
+        return f"{path}:{os.path.getmtime(path)}:{self.backend}:{self.quantization}:{preprocessing}"
+
+    async def load(self, name: str, path: str, preprocessing: str = "unit") -> ModelEntry:
+        """
+        Load and warm up a model in every inference worker, then publish it under name.
+        Reloading an existing name replaces it once the new model is warm.
+
+        :raises ModelLoadFailed: if the file is not a model the backend can load and run
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found at {path}")
+        started = time.perf_counter()
+        worker_name = f"{name}@{time.time_ns()}"
+        try:
+            await self.executor.run_on_every_worker(
+                inference.load_model, worker_name, path, preprocessing, self.backend,
+                self.quantization, self.num_threads, self.warmup_batch_sizes,
+            )
+        except Exception as e:
+            # Workers that did load it must not keep the model
+            await self.executor.run_on_every_worker(inference.unload_model, worker_name)
+            raise ModelLoadFailed(f"Could not load model {name} from {path}: {e!r}") from e
+        batcher = InferenceBatcher(
+            partial(inference.predict_model, worker_name),
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=self.max_wait_ms,
+            executor=self.executor,
+            name=name,
+        )
+        batcher.start()
+        cache = PredictionCache(self.model_identity(path, preprocessing), self.cache_size, self.cache_dir,
+                                self.cache_disk_items)
+        entry = ModelEntry(name, worker_name, path, preprocessing, batcher, cache)
+        previous = self.models.get(name)
+        self.models[name] = entry
+        if self.default is None:
+            self.default = name
+        if previous is not None:
+            previous.retired = True
+            if previous.in_use == 0:
+                await self._release(previous)
+        logger.info(f"Model {name} loaded from {path} ({self.backend}) in {time.perf_counter() - started:.1f}s")
+        return entry
+
+    def set_default(self, name: str):
+        if name not in self.models:
+            raise KeyError(name)
+        self.default = name
+
+    def set_candidate(self, name: str | None, share: float):
+        if name is not None and name not in self.models:
+            raise KeyError(name)
+        self.candidate = name
+        self.candidate_share = share if name is not None else 0.0
+
+    def get(self, name: str) -> ModelEntry:
+        return self.models[name]
+
+    def choose(self) -> ModelEntry:
+        if self.candidate is not None and random.random() < self.candidate_share:
+            return self.models[self.candidate]
+        return self.models[self.default]
+
+    @contextlib.contextmanager
+    def use(self, name: str | None = None):
+        """
+        Pin a model for the duration of one request: the named one, or the
+        default/candidate according to the traffic split.
+        """
+        entry = self.models[name] if name is not None else self.choose()
+        entry.in_use += 1
+        try:
+            yield entry
+        finally:
+            entry.in_use -= 1
+            if entry.retired and entry.in_use == 0:
+                asyncio.get_running_loop().create_task(self._release(entry))
+
+    async def _release(self, entry: ModelEntry):
+        await entry.batcher.stop()
+        await entry.cache.flush()
+        await self.executor.run_on_every_worker(inference.unload_model, entry.worker_name)
+        logger.info(f"Previous version of model {entry.name} unloaded")
+
+    async def decode(self, img_bytes: bytes) -> np.ndarray:
+        """
+        decode_image on the executor, recording decode and resize time.
+        """
+        img, decode_s, resize_s = await self.executor.run(decode_image_timed, img_bytes)
+        metrics.DECODE_SECONDS.observe(decode_s)
+        metrics.RESIZE_SECONDS.observe(resize_s)
+        return img
+
+    async def predict(self, entry: ModelEntry, img: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        try:
+            predictions = await entry.batcher.predict(img)
+        except Exception:
+            entry.stats.errors += 1
+            raise
+        entry.stats.record(time.perf_counter() - started)
+        return predictions
+
+    async def classify(self, entry: ModelEntry, img_bytes: bytes, cache_key: str,
+                       img: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        Class probabilities for an uploaded file, from the model's cache when possible.
+
+        :param img: np.ndarray: Already decoded input, to avoid decoding the same bytes twice
+        :return: (probabilities, decoded input or the given img; None on a cache hit without img)
+        """
+        predictions = await entry.cache.get(cache_key)
+        if predictions is not None:
+            return predictions, img
+        if img is None:
+            img = await self.decode(img_bytes)
+        predictions = await self.predict(entry, img)
+        entry.cache.put(cache_key, predictions)
+        return predictions, img
+
+    async def classify_many(self, entry: ModelEntry, contents: list[bytes], keys: list[str],
+                            decoded: dict[str, asyncio.Future]) -> list[np.ndarray | None]:
+        """
+        Class probabilities for many uploaded files, from the model's cache when possible.
+        The rest are decoded in parallel and predicted in batches of max_batch_size.
+
+        :param decoded: dict: Decoding tasks by cache key, shared by the models answering one
+            request so every file is decoded at most once
+        :return: Probabilities per file, None for files that could not be decoded
+        """
+        rows = await entry.cache.get_many(keys)
+        missing = [i for i, row in enumerate(rows) if row is None]
+        for i in missing:
+            if keys[i] not in decoded:
+                decoded[keys[i]] = asyncio.ensure_future(self.decode(contents[i]))
+        images = await asyncio.gather(*(decoded[keys[i]] for i in missing), return_exceptions=True)
+        ok = [(i, img) for i, img in zip(missing, images) if not isinstance(img, Exception)]
+        batches = [np.stack([img for _, img in ok[start:start + self.max_batch_size]])
+                   for start in range(0, len(ok), self.max_batch_size)]
+        chunks = await asyncio.gather(*(self.predict_many(entry, batch) for batch in batches))
+        for (i, _), row in zip(ok, (row for chunk in chunks for row in chunk)):
+            rows[i] = row
+            entry.cache.put(keys[i], row)
+        return rows
+
+    async def predict_many(self, entry: ModelEntry, images: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        try:
+            predictions = await self.executor.run(partial(inference.predict_model, entry.worker_name), images)
+        except Exception:
+            entry.stats.errors += 1
+            raise
+        elapsed = time.perf_counter() - started
+        entry.stats.record(elapsed, images=len(images))
+        metrics.PREDICT_SECONDS.labels(entry.name).observe(elapsed)
+        metrics.BATCH_SIZE.labels(entry.name).observe(len(images))
+        return predictions
+
+    async def stop(self):
+        for entry in self.models.values():
+            await entry.batcher.stop()
+            await entry.cache.flush()
+
+    def describe(self) -> dict:
+        return {
+            "default": self.default,
+            "candidate": self.candidate,
+            "candidate_share": self.candidate_share,
+            "models": {
+                name: {
+                    "path": entry.path,
+                    "preprocessing": entry.preprocessing,
+                    "loaded_at": entry.loaded_at,
+                    "stats": entry.stats.snapshot(),
+                }
+                for name, entry in self.models.items()
+            },
+        }
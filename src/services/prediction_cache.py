@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Class probabilities keyed by the hash of the uploaded bytes and the model
+    identity, so a new model never serves predictions of the old one.
+
+    The in-memory tier is an LRU of max_items entries. When disk_dir is set,
+    every entry is also written there as .npy and survives restarts; memory
+    misses fall back to disk and promote the entry back into memory. Disk
+    reads and writes run in worker threads, writes in the background, and
+    the disk tier keeps at most max_disk_items files, removing the least
+    recently used ones (after a restart, the oldest written).
+    """
+
+    def __init__(self, model_identity: str, max_items: int, disk_dir: str | None = None,
+                 max_disk_items: int = 100_000):
+        self.namespace = hashlib.sha256(model_identity.encode()).hexdigest()[:16]
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.disk_dir = os.path.join(disk_dir, self.namespace) if disk_dir else None
+        self._items: OrderedDict[str, np.ndarray] = OrderedDict()
+        # Keys of the files on disk in LRU order, read from the directory on first disk access
+        self._disk_keys: OrderedDict[str, None] | None = None
+        self._disk_lock = threading.Lock()
+        self._writes: set[asyncio.Task] = set()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npy")
+
+    def _remember(self, key: str, predictions: np.ndarray):
+        if self.max_items <= 0:
+            return
+        self._items[key] = predictions
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def _disk_index(self) -> OrderedDict:
+        """
+        Must be called with _disk_lock held.
+        """
+        if self._disk_keys is None:
+            entries = []
+            if os.path.isdir(self.disk_dir):
+                for root, _, files in os.walk(self.disk_dir):
+                    for name in files:
+                        if name.endswith(".npy"):
+                            entries.append((os.path.getmtime(os.path.join(root, name)), name[:-len(".npy")]))
+            self._disk_keys = OrderedDict((key, None) for _, key in sorted(entries))
+        return self._disk_keys
+
+    def _load(self, keys: list[str]) -> list[np.ndarray | None]:
+        results = []
+        for key in keys:
+            try:
+                predictions = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                predictions = None
+            results.append(predictions)
+        with self._disk_lock:
+            index = self._disk_index()
+            for key, predictions in zip(keys, results):
+                if predictions is not None:
+                    index[key] = None
+                    index.move_to_end(key)
+        return results
+
+    def _store(self, key: str, predictions: np.ndarray):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, predictions)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Prediction cache write failed: {e}")
+            return
+        with self._disk_lock:
+            index = self._disk_index()
+            index[key] = None
+            index.move_to_end(key)
+            evicted = []
+            while len(index) > self.max_disk_items:
+                evicted.append(index.popitem(last=False)[0])
+        for key in evicted:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._disk_path(key))
+
+    async def get_many(self, keys: list[str]) -> list[np.ndarray | None]:
+        """
+        Cached predictions of every key, None where there are none. Keys missing
+        in memory are read from disk in one worker-thread call.
+        """
+        results = [self._items.get(key) for key in keys]
+        for key, predictions in zip(keys, results):
+            if predictions is not None:
+                self._items.move_to_end(key)
+        missing = [i for i, predictions in enumerate(results) if predictions is None]
+        if missing and self.disk_dir:
+            loaded = await asyncio.to_thread(self._load, [keys[i] for i in missing])
+            for i, predictions in zip(missing, loaded):
+                if predictions is not None:
+                    self._remember(keys[i], predictions)
+                    results[i] = predictions
+                    self.disk_hits += 1
+        found = sum(predictions is not None for predictions in results)
+        self.hits += found
+        self.misses += len(keys) - found
+        return results
+
+    async def get(self, key: str) -> np.ndarray | None:
+        return (await self.get_many([key]))[0]
+
+    def put(self, key: str, predictions: np.ndarray):
+        predictions = np.asarray(predictions, dtype=np.float32)
+        self._remember(key, predictions)
+        if self.disk_dir:
+            # The response does not wait for the disk write
+            task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._store, key, predictions))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def flush(self):
+        """
+        Wait for the disk writes still in flight.
+        """
+        if self._writes:
+            await asyncio.gather(*self._writes)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self._items),
+            "max_items": self.max_items,
+            "disk": self.disk_dir is not None,
+            "disk_items": len(self._disk_keys) if self._disk_keys is not None else None,
+            "max_disk_items": self.max_disk_items,
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.models.predictions import PredictionModel
+from src.repositories.predictions import PredictionRepo
+from src.services.batcher import collect_batch
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionHistory:
+    """
+    Records every prediction without making the request wait for the database.
+    record() only appends to an in-memory queue; a background task inserts the
+    rows in bulk every flush_interval_ms or as soon as max_batch_size rows are
+    waiting. When the queue is full (database down or too slow), new rows are
+    dropped and counted instead of growing memory.
+    """
+
+    def __init__(self, url: str, max_batch_size: int = 500, flush_interval_ms: float = 1000.0,
+                 max_queue_size: int = 100_000):
+        self.url = url
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.max_queue_size = max_queue_size
+        self.engine = None
+        self._session_maker = None
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._worker is not None:
+            return
+        self.engine = create_async_engine(self.url)
+        self._session_maker = async_sessionmaker(autoflush=False, bind=self.engine)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(PredictionModel.metadata.create_all, tables=[PredictionModel.__table__])
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flush the rows still queued, then close the engine.
+        """
+        if self._worker is not None:
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+            await self.engine.dispose()
+
+    def record(self, content_hash: str, filename: str | None, model: str, top_k: list[dict], latency_ms: float):
+        if self._worker is None:
+            return
+        row = {
+            "content_hash": content_hash,
+            "filename": filename,
+            "model": model,
+            "predicted_class": top_k[0]["label"],
+            "probability": top_k[0]["probability"],
+            "top_k": top_k,
+            "latency_ms": latency_ms,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        async with self._session_maker() as session:
+            yield session
+
+    async def _run(self):
+        while True:
+            rows, stopping = await collect_batch(self._queue, self.max_batch_size, self.flush_interval)
+            if rows:
+                started = time.perf_counter()
+                try:
+                    async with self.session() as session:
+                        await PredictionRepo(session).add_many(rows)
+                    self.written += len(rows)
+                    logger.debug(f"Prediction history: {len(rows)} rows in {(time.perf_counter() - started) * 1000:.1f}ms")
+                except Exception as e:
+                    self.failed += len(rows)
+                    logger.error(f"Could not write prediction history: {e}")
+            if stopping:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue_depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,96 @@
+import io
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (32, 32)
+
+# Keep at least this many source pixels per model pixel after a reduced
+# decode, so the final INTER_AREA downscale still has detail to average
+MIN_OVERSAMPLING = 2
+
+# libjpeg scales by 1/2, 1/4 or 1/8 in the DCT domain while decoding,
+# the same mechanism as PIL's JPEG draft mode
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+def probe_image(img_bytes: bytes) -> tuple[str | None, tuple[int, int] | None]:
+    """
+    Read the format and size from the image header without decoding pixels.
+
+    :return: (PIL format name, (width, height)), or (None, None) if the header is not recognized
+    """
+    try:
+        with Image.open(io.BytesIO(img_bytes)) as img:
+            return img.format, img.size
+    except Exception:
+        return None, None
+
+
+def choose_decode_flag(image_format: str | None, size: tuple[int, int] | None, target: int = IMAGE_SIZE[0]) -> int:
+    if image_format != "JPEG" or size is None:
+        return cv2.IMREAD_COLOR
+    width, height = size
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if min(width // factor, height // factor) >= target * MIN_OVERSAMPLING:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_reduced(img_bytes: bytes, target: int = IMAGE_SIZE[0]) -> np.ndarray:
+    """
+    Decode uploaded bytes at the lowest resolution that still keeps
+    MIN_OVERSAMPLING source pixels per target pixel.
+
+    :param target: int: Side of the image that will be produced from the result
+    :return: BGR uint8 array
+    """
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    image_format, size = probe_image(img_bytes)
+    img = cv2.imdecode(nparr, choose_decode_flag(image_format, size, target))
+    if img is None:
+        raise ValueError("Could not decode image")
+    return img
+
+
+def decode_image_uint8(img_bytes: bytes) -> np.ndarray:
+    """
+    Decode uploaded bytes and downscale them to the model input size.
+    Large JPEGs are decoded at 1/2, 1/4 or 1/8 resolution, so a
+    multi-megapixel photo never exists in memory at full size.
+
+    :param img_bytes: bytes: Raw content of the uploaded file
+    :return: BGR uint8 array of shape (32, 32, 3)
+    """
+    return cv2.resize(decode_reduced(img_bytes), IMAGE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def decode_image(img_bytes: bytes) -> np.ndarray:
+    """
+    Decode uploaded bytes into a normalized float32 model input without the batch axis.
+
+    :param img_bytes: bytes: Raw content of the uploaded file
+    :return: Array of shape (32, 32, 3) with values in [0, 1]
+    """
+    return decode_image_uint8(img_bytes).astype('float32') / 255.0
+
+
+def decode_image_timed(img_bytes: bytes) -> tuple[np.ndarray, float, float]:
+    """
+    decode_image that also reports how long decoding and resizing took. The
+    timings are returned rather than recorded here, so they reach the
+    metrics of the main process from process pool workers as well.
+
+    :return: (model input, decode seconds, resize seconds)
+    """
+    started = time.perf_counter()
+    img = decode_reduced(img_bytes)
+    decoded = time.perf_counter()
+    img = cv2.resize(img, IMAGE_SIZE, interpolation=cv2.INTER_AREA).astype('float32') / 255.0
+    return img, decoded - started, time.perf_counter() - decoded
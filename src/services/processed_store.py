@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from src.services import metrics
+from src.services.batcher import collect_batch
+from src.services.preprocessing import IMAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+ROW_SHAPE = (*IMAGE_SIZE, 3)
+ROW_BYTES = int(np.prod(ROW_SHAPE))
+
+IMAGES_FILE = "images.u8"
+LABELS_FILE = "labels.u8"
+INDEX_FILE = "index.jsonl"
+
+
+def _stored_rows(directory: str) -> int:
+    # A crash can leave a partial row or an image without its label
+    images_path = os.path.join(directory, IMAGES_FILE)
+    labels_path = os.path.join(directory, LABELS_FILE)
+    images = os.path.getsize(images_path) // ROW_BYTES if os.path.exists(images_path) else 0
+    labels = os.path.getsize(labels_path) if os.path.exists(labels_path) else 0
+    return min(images, labels)
+
+
+def load_processed_dataset(directory: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Open the store as a training set without copying it into memory.
+
+    :param directory: str: Directory of a ProcessedImageStore
+    :return: (read-only memmap of shape (N, 32, 32, 3), BGR uint8; predicted class index per row)
+    """
+    rows = _stored_rows(directory)
+    if rows == 0:
+        return np.zeros((0, *ROW_SHAPE), dtype=np.uint8), np.zeros(0, dtype=np.uint8)
+    images = np.memmap(os.path.join(directory, IMAGES_FILE), dtype=np.uint8, mode="r", shape=(rows, *ROW_SHAPE))
+    labels = np.fromfile(os.path.join(directory, LABELS_FILE), dtype=np.uint8, count=rows)
+    return images, labels
+
+
+class ProcessedImageStore:
+    """
+    Append-only store of resized uploads: one uint8 array file of
+    N x 32 x 32 x 3 rows in BGR order, as decoded by OpenCV (before the
+    per-model INPUT_PREPROCESSING, which reverses them to RGB for "unit"
+    models), one byte per row with the predicted class, and a JSON lines index
+    mapping upload IDs and content hashes to rows. Identical content is stored
+    once.
+
+    Writes are queued and appended in batches by a background task; images
+    still waiting in the queue are served from memory. Reads go through a
+    memory map of the array file.
+    """
+
+    def __init__(self, directory: str, max_batch_size: int = 256, max_wait_ms: float = 200.0):
+        self.directory = directory
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._rows_by_id: dict[str, int] = {}
+        self._rows_by_hash: dict[str, int] = {}
+        # Not yet written: upload ID -> content hash, content hash -> image
+        self._pending_ids: dict[str, str] = {}
+        self._pending_images: dict[str, np.ndarray] = {}
+        self._count = 0
+        self._map: np.memmap | None = None
+        self._files = None
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._load_index()
+
+    def __len__(self):
+        return self._count
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._count = _stored_rows(self.directory)
+        for name, size in ((IMAGES_FILE, self._count * ROW_BYTES), (LABELS_FILE, self._count)):
+            if os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) > size:
+                os.truncate(self._path(name), size)
+        if not os.path.exists(self._path(INDEX_FILE)):
+            return
+        with open(self._path(INDEX_FILE)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record["row"] < self._count:
+                    self._rows_by_id[record["id"]] = record["row"]
+                    self._rows_by_hash[record["sha256"]] = record["row"]
+
+    def start(self):
+        if self._worker is None:
+            self._files = [open(self._path(name), mode) for name, mode in
+                           ((IMAGES_FILE, "ab"), (LABELS_FILE, "ab"), (INDEX_FILE, "a"))]
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Write everything still queued, then close the files.
+        """
+        if self._worker is not None:
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+            for f in self._files:
+                f.close()
+            self._files = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def put(self, upload_id: str, content_hash: str, img: np.ndarray, label: int):
+        """
+        Queue a preprocessed image for writing.
+
+        :param img: np.ndarray: Model input of shape (32, 32, 3), float in [0, 1] or uint8
+        :param label: int: Predicted class index
+        """
+        if img.dtype != np.uint8:
+            img = np.rint(img * 255).astype(np.uint8)
+        self._pending_ids[upload_id] = content_hash
+        self._pending_images.setdefault(content_hash, img)
+        self._queue.put_nowait((upload_id, content_hash, img, label))
+
+    def link(self, upload_id: str, content_hash: str) -> bool:
+        """
+        Point upload_id at content that is already stored (or queued).
+
+        :return: False when no image with this content is known
+        """
+        if content_hash not in self._rows_by_hash and content_hash not in self._pending_images:
+            return False
+        self._pending_ids[upload_id] = content_hash
+        self._queue.put_nowait((upload_id, content_hash, None, None))
+        return True
+
+    def get(self, upload_id: str) -> np.ndarray | None:
+        """
+        :return: BGR uint8 image of shape (32, 32, 3), or None for an unknown upload ID
+        """
+        content_hash = self._pending_ids.get(upload_id)
+        if content_hash is not None:
+            img = self._pending_images.get(content_hash)
+            if img is not None:
+                return img
+            row = self._rows_by_hash.get(content_hash)
+        else:
+            row = self._rows_by_id.get(upload_id)
+        if row is None:
+            return None
+        if self._map is None or len(self._map) <= row:
+            self._map = np.memmap(self._path(IMAGES_FILE), dtype=np.uint8, mode="r",
+                                  shape=(self._count, *ROW_SHAPE))
+        return np.array(self._map[row])
+
+    def _append(self, images: list[np.ndarray], labels: list[int], records: list[dict]):
+        images_file, labels_file, index_file = self._files
+        if images:
+            images_file.write(np.stack(images).tobytes())
+            images_file.flush()
+            labels_file.write(np.array(labels, dtype=np.uint8).tobytes())
+            labels_file.flush()
+        index_file.write("".join(json.dumps(record) + "\n" for record in records))
+        index_file.flush()
+
+    async def _write(self, batch: list):
+        images, labels, records = [], [], []
+        new_rows: dict[str, int] = {}
+        for upload_id, content_hash, img, label in batch:
+            row = self._rows_by_hash.get(content_hash, new_rows.get(content_hash))
+            if row is None:
+                if img is None:
+                    # Linked content was never stored
+                    if self._pending_ids.get(upload_id) == content_hash:
+                        del self._pending_ids[upload_id]
+                    continue
+                row = new_rows[content_hash] = self._count + len(images)
+                images.append(img)
+                labels.append(label)
+            records.append({"id": upload_id, "sha256": content_hash, "row": row})
+
+        started = time.perf_counter()
+        await asyncio.to_thread(self._append, images, labels, records)
+        elapsed = time.perf_counter() - started
+        metrics.SAVE_SECONDS.observe(elapsed)
+        self._count += len(images)
+        for record in records:
+            self._rows_by_id[record["id"]] = record["row"]
+            self._rows_by_hash[record["sha256"]] = record["row"]
+            if self._pending_ids.get(record["id"]) == record["sha256"]:
+                del self._pending_ids[record["id"]]
+            self._pending_images.pop(record["sha256"], None)
+        logger.debug(f"Processed images stored: rows={len(images)} links={len(records)} "
+                     f"in {elapsed * 1000:.1f}ms")
+
+    async def _run(self):
+        while True:
+            batch, stopping = await collect_batch(self._queue, self.max_batch_size, self.max_wait)
+            if batch:
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    logger.error(f"Could not store processed images: {e}")
+            if stopping:
+                return
@@ -0,0 +1,45 @@
+import os
+import uuid
+
+import cv2
+
+from src.services.preprocessing import decode_reduced
+
+JPEG_QUALITY = 85
+
+
+def thumbnail_path(thumbnail_dir: str, size: int, filename: str) -> str:
+    return os.path.join(thumbnail_dir, str(size), f"{filename}.jpg")
+
+
+def make_thumbnail(source_path: str, dest_path: str, size: int):
+    """
+    Write a JPEG no larger than size x size, keeping the aspect ratio.
+    Large JPEGs are decoded at reduced resolution, like model inputs.
+    """
+    with open(source_path, "rb") as f:
+        img = decode_reduced(f.read(), size)
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])[1].tobytes())
+    os.replace(tmp_path, dest_path)
+
+
+def ensure_thumbnail(source_path: str, thumbnail_dir: str, size: int, filename: str) -> str:
+    """
+    Path of the cached thumbnail, created on first use and again after the original is replaced.
+    """
+    path = thumbnail_path(thumbnail_dir, size, filename)
+    try:
+        if os.stat(path).st_mtime >= os.stat(source_path).st_mtime:
+            return path
+    except FileNotFoundError:
+        pass
+    make_thumbnail(source_path, path, size)
+    return path
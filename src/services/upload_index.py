@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UploadRecord:
+    seq: int
+    filename: str
+    size: int
+    uploaded_at: float
+
+
+class UploadIndex:
+    """
+    In-memory list of uploads in upload order, so listing a page costs
+    O(page size) instead of a directory scan. Uploading a file with
+    an existing name moves it to the end; the older record is skipped when
+    listing. The cursor of a page is the sequence number of its last record.
+
+    When persist_path is set, records are appended there as JSON lines and
+    reloaded on start, then reconciled with the directory: records of
+    deleted files are dropped, and files replaced or added outside the
+    server are moved to or added at their modification time. Unreadable
+    lines are skipped. Without that file the index is built once from the
+    directory, ordered by modification time.
+    """
+
+    def __init__(self, directory: str, persist_path: str | None = None):
+        self.directory = directory
+        self.persist_path = persist_path
+        self._records: list[UploadRecord] = []
+        self._latest: dict[str, int] = {}
+        self._file = None
+        if persist_path and os.path.exists(persist_path):
+            self._load()
+        else:
+            self._scan()
+            if persist_path:
+                self._rewrite()
+        if persist_path:
+            self._file = open(persist_path, "a", buffering=1)
+
+    def __len__(self):
+        return len(self._latest)
+
+    def _append(self, filename: str, size: int, uploaded_at: float) -> UploadRecord:
+        record = UploadRecord(len(self._records), filename, size, uploaded_at)
+        self._records.append(record)
+        self._latest[filename] = record.seq
+        return record
+
+    def _files(self) -> dict[str, tuple[float, int]]:
+        """
+        :return: {file name: (modification time, size)} of the uploads in the directory
+        """
+        files = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def _scan(self):
+        files = self._files()
+        for filename, (uploaded_at, size) in sorted(files.items(), key=lambda item: (item[1][0], item[0])):
+            self._append(filename, size, uploaded_at)
+        logger.info(f"Upload index built from {self.directory}: {len(files)} images")
+
+    def _load(self):
+        records, lines, skipped = {}, 0, 0
+        with open(self.persist_path, "rb") as f:
+            for line in f:
+                lines += 1
+                try:
+                    item = json.loads(line)
+                    filename, size, uploaded_at = str(item["filename"]), int(item["size"]), float(item["uploaded_at"])
+                except (ValueError, TypeError, KeyError):
+                    skipped += 1
+                    continue
+                # A later upload with the same name replaces the earlier record
+                records.pop(filename, None)
+                records[filename] = (uploaded_at, size)
+        if skipped:
+            logger.warning(f"Upload index {self.persist_path}: skipped {skipped} unreadable lines")
+
+        files = self._files()
+        # Unreadable lines and records replaced by a later upload are left out of the rewritten file
+        live, changed = [], lines != len(records)
+        for filename, (uploaded_at, size) in records.items():
+            if filename not in files:
+                changed = True
+                continue
+            mtime, file_size = files.pop(filename)
+            if file_size != size or mtime > uploaded_at:
+                # Replaced outside the server
+                live.append((mtime, filename, file_size))
+                changed = True
+            else:
+                live.append((uploaded_at, filename, size))
+        # Files added outside the server
+        live.extend((mtime, filename, size) for filename, (mtime, size) in files.items())
+        changed = changed or bool(files)
+        for uploaded_at, filename, size in sorted(live):
+            self._append(filename, size, uploaded_at)
+        if changed:
+            self._rewrite()
+
+    def _rewrite(self):
+        with open(f"{self.persist_path}.tmp", "w") as f:
+            for r in self._records:
+                f.write(json.dumps({"filename": r.filename, "size": r.size, "uploaded_at": r.uploaded_at}) + "\n")
+        os.replace(f"{self.persist_path}.tmp", self.persist_path)
+
+    def add(self, filename: str, size: int, uploaded_at: float | None = None) -> UploadRecord:
+        record = self._append(filename, size, time.time() if uploaded_at is None else uploaded_at)
+        if self._file is not None:
+            self._file.write(json.dumps({"filename": filename, "size": size, "uploaded_at": record.uploaded_at}) + "\n")
+        return record
+
+    def page(self, cursor: int | None = None, limit: int = 50, newest_first: bool = True) -> tuple[list[UploadRecord], int | None]:
+        """
+        :param cursor: int: Value of next_cursor from the previous page, None for the first page
+        :return: (records, next_cursor or None on the last page)
+        """
+        if newest_first:
+            position = len(self._records) - 1 if cursor is None else cursor - 1
+            step = -1
+        else:
+            position = 0 if cursor is None else cursor + 1
+            step = 1
+        items = []
+        while 0 <= position < len(self._records) and len(items) < limit:
+            record = self._records[position]
+            if self._latest.get(record.filename) == record.seq:
+                items.append(record)
+            position += step
+        has_more = 0 <= position < len(self._records)
+        return items, items[-1].seq if items and has_more else None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,386 @@
+import hashlib
+import io
+import os
+import uuid
+import zipfile
+import zlib
+from dataclasses import dataclass
+
+from fastapi import Request, status
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from src.conf import messages
+
+ZIP_CONTENT_TYPES = ["application/zip", "application/x-zip-compressed"]
+
+# Magic bytes of the supported image formats
+IMAGE_SIGNATURES = {
+    "image/png": [b"\x89PNG\r\n\x1a\n"],
+    "image/jpeg": [b"\xff\xd8\xff"],
+    "image/jpg": [b"\xff\xd8\xff"],
+}
+SIGNATURE_SIZE = max(len(sig) for sigs in IMAGE_SIGNATURES.values() for sig in sigs)
+
+# Longest file name most filesystems accept, in bytes
+MAX_FILENAME_BYTES = 255
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+
+class UploadRejected(Exception):
+    def __init__(self, detail: str, status_code: int = status.HTTP_400_BAD_REQUEST):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+@dataclass
+class ReceivedUpload:
+    filename: str
+    path: str | None
+    content: bytearray
+    sha256: str
+
+
+@dataclass
+class ReceivedFile:
+    filename: str
+    content_type: str | None
+    content: bytearray
+
+
+def is_zip_upload(filename: str | None, content_type: str | None) -> bool:
+    return content_type in ZIP_CONTENT_TYPES or (filename or "").lower().endswith(".zip")
+
+
+def read_zip_images(content: bytes, max_files: int, max_file_size: int,
+                    max_total_size: int) -> list[tuple[str, bytes, str | None]]:
+    """
+    Read the files of a zip archive into memory.
+
+    Sizes are checked against the archive directory before anything is
+    decompressed, so oversized members, archives with too many files and
+    archives that inflate past max_total_size are rejected without inflating
+    them. A member that cannot be extracted (corrupted, encrypted or
+    compressed with an unsupported method) is reported with an error instead
+    of failing the whole archive.
+
+    :param content: bytes: Zip archive
+    :param max_files: int: Maximum number of files in the archive
+    :param max_file_size: int: Maximum uncompressed size of one file
+    :param max_total_size: int: Maximum uncompressed size of all files together
+    :return: List of (member name, member bytes, error message or None)
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile as e:
+        raise UploadRejected(messages.INVALID_ZIP_ARCHIVE) from e
+
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        if len(members) > max_files:
+            raise UploadRejected(messages.TOO_MANY_FILES)
+        for info in members:
+            if info.file_size > max_file_size:
+                raise UploadRejected(f"{info.filename} is larger than {max_file_size} bytes",
+                                     status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        # Members are never inflated past their declared size, so this bounds the memory used
+        if sum(info.file_size for info in members) > max_total_size:
+            raise UploadRejected(messages.BATCH_TOO_LARGE, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        files = []
+        for info in members:
+            try:
+                files.append((info.filename, archive.read(info), None))
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                files.append((info.filename, b"", messages.CORRUPTED_ZIP_MEMBER))
+            except (RuntimeError, NotImplementedError):
+                # Encrypted members and unsupported compression methods
+                files.append((info.filename, b"", messages.UNSUPPORTED_ZIP_MEMBER))
+        return files
+
+
+def safe_filename(filename: str) -> str:
+    """
+    The last path component of a client-supplied file name, for storing the
+    file under that name. Hidden names are refused: files of the server
+    itself, such as temporary upload parts, start with a dot.
+
+    :raises UploadRejected: for empty, ".", "..", hidden or too long names
+    """
+    name = os.path.basename(filename.replace("\\", "/"))
+    if not name or name.startswith(".") or "\0" in name or len(name.encode()) > MAX_FILENAME_BYTES:
+        raise UploadRejected(messages.INVALID_FILENAME)
+    return name
+
+
+def sniff_image_type(head: bytes, allowed_types: list[str]) -> str | None:
+    for content_type in allowed_types:
+        for signature in IMAGE_SIGNATURES.get(content_type, []):
+            if head.startswith(signature):
+                return content_type
+    return None
+
+
+class _MultipartReceiver:
+    """
+    Collects the headers of every part for python-multipart's MultipartParser.
+    Subclasses handle the part data.
+    """
+
+    def __init__(self):
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": lambda data, start, end: self._add_header_field(data[start:end]),
+            "on_header_value": lambda data, start, end: self._add_header_value(data[start:end]),
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def _add_header_field(self, data: bytes):
+        self._header_field += data
+
+    def _add_header_value(self, data: bytes):
+        self._header_value += data
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def file_part(self) -> tuple[str | None, str | None]:
+        """
+        :return: (field name, file name or None if the part is not a file)
+        """
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        return (options.get(b"name", b"").decode("latin-1"),
+                filename.decode("utf-8", "replace") if filename is not None else None)
+
+
+class _ImagePartReceiver(_MultipartReceiver):
+    """
+    Multipart callbacks for one image field. The file part is written to disk,
+    hashed and kept in memory chunk by chunk; the size limit and magic bytes
+    are checked as the data arrives.
+    """
+
+    def __init__(self, field_name: str, dest_dir: str | None, max_size: int, allowed_types: list[str]):
+        super().__init__()
+        self.field_name = field_name
+        self.dest_dir = dest_dir
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+        self.filename = None
+        self.tmp_path = None
+        self.size = 0
+        self.buffer = bytearray()
+        self.hasher = hashlib.sha256()
+        self.pending = []
+        self.done = False
+        self._file = None
+        self._in_file_part = False
+        self._checked = False
+
+    def on_headers_finished(self):
+        name, filename = self.file_part()
+        self._in_file_part = not self.done and name == self.field_name and filename is not None
+        if self._in_file_part:
+            self.filename = os.path.basename(filename)
+            if not self.filename:
+                raise UploadRejected(messages.NO_FILE_UPLOADED)
+            if self.dest_dir is not None:
+                # The file is stored under this name
+                self.filename = safe_filename(self.filename)
+                self.tmp_path = os.path.join(self.dest_dir, f".{uuid.uuid4().hex}.part")
+                self._file = open(self.tmp_path, "wb")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if not self._in_file_part:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadRejected(messages.FILE_TOO_LARGE, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.buffer += chunk
+        if not self._checked and len(self.buffer) >= SIGNATURE_SIZE:
+            self._check_type()
+        self.hasher.update(chunk)
+        if self._file is not None:
+            self.pending.append(chunk)
+
+    def on_part_end(self):
+        if self._in_file_part:
+            if not self._checked:
+                self._check_type()
+            self._in_file_part = False
+            self.done = True
+
+    def _check_type(self):
+        self._checked = True
+        if sniff_image_type(bytes(self.buffer[:SIGNATURE_SIZE]), self.allowed_types) is None:
+            raise UploadRejected(messages.UNSUPPORTED_IMAGE_TYPE, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def flush(self):
+        if self.pending:
+            self._file.write(b"".join(self.pending))
+            self.pending = []
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+async def receive_image_upload(request: Request, field_name: str, dest_dir: str | None,
+                               max_size: int, allowed_types: list[str]) -> ReceivedUpload:
+    """
+    Read a multipart/form-data request body in a single pass. The image field
+    is written to dest_dir (unless it is None), hashed and collected for decoding
+    at the same time, and the request is rejected as soon as it exceeds max_size
+    or its first bytes do not match one of allowed_types.
+
+    :raises UploadRejected: with the HTTP status code to answer with
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(messages.NO_FILE_UPLOADED)
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD_BYTES:
+        raise UploadRejected(messages.FILE_TOO_LARGE, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    receiver = _ImagePartReceiver(field_name, dest_dir, max_size, allowed_types)
+    parser = MultipartParser(boundary, receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if receiver.pending:
+                await run_in_threadpool(receiver.flush)
+        parser.finalize()
+        if not receiver.done:
+            raise UploadRejected(messages.NO_FILE_UPLOADED)
+        receiver.close()
+        path = None
+        if dest_dir is not None:
+            path = os.path.join(dest_dir, receiver.filename)
+            os.replace(receiver.tmp_path, path)
+    except ValueError as e:
+        # python-multipart reports malformed bodies as ValueError subclasses
+        receiver.discard()
+        raise UploadRejected(messages.INVALID_MULTIPART_BODY) from e
+    except BaseException:
+        receiver.discard()
+        raise
+
+    return ReceivedUpload(
+        filename=receiver.filename,
+        path=path,
+        content=receiver.buffer,
+        sha256=receiver.hasher.hexdigest(),
+    )
+
+
+class _BatchPartReceiver(_MultipartReceiver):
+    """
+    Multipart callbacks for a field with many files. Every file is kept in
+    memory and checked as the data arrives: images against max_file_size,
+    zip archives against max_total_size, and all parts together against
+    max_total_size.
+    """
+
+    def __init__(self, field_name: str, max_files: int, max_file_size: int, max_total_size: int):
+        super().__init__()
+        self.field_name = field_name
+        self.max_files = max_files
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.files = []
+        self.total_size = 0
+        self._current = None
+        self._limit = 0
+
+    def on_headers_finished(self):
+        name, filename = self.file_part()
+        self._current = None
+        if name != self.field_name or filename is None:
+            return
+        if len(self.files) >= self.max_files:
+            raise UploadRejected(messages.TOO_MANY_FILES)
+        content_type = self._headers.get(b"content-type")
+        self._current = ReceivedFile(filename, content_type.decode("latin-1") if content_type else None, bytearray())
+        self._limit = (self.max_total_size if is_zip_upload(filename, self._current.content_type)
+                       else self.max_file_size)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._current is None:
+            return
+        self._current.content += data[start:end]
+        self.total_size += end - start
+        if len(self._current.content) > self._limit:
+            raise UploadRejected(f"{self._current.filename} is larger than {self._limit} bytes",
+                                 status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if self.total_size > self.max_total_size:
+            raise UploadRejected(messages.BATCH_TOO_LARGE, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def on_part_end(self):
+        if self._current is not None:
+            self.files.append(self._current)
+            self._current = None
+
+
+async def receive_batch_upload(request: Request, field_name: str, max_files: int, max_file_size: int,
+                               max_total_size: int) -> list[ReceivedFile]:
+    """
+    Read the files of a multipart/form-data field in a single pass, rejecting
+    the request as soon as it has more than max_files files, an image larger
+    than max_file_size or more than max_total_size bytes of files.
+
+    :raises UploadRejected: with the HTTP status code to answer with
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(messages.NO_FILE_UPLOADED)
+
+    content_length = request.headers.get("content-length")
+    if (content_length and content_length.isdigit()
+            and int(content_length) > max_total_size + MULTIPART_OVERHEAD_BYTES * max_files):
+        raise UploadRejected(messages.BATCH_TOO_LARGE, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    receiver = _BatchPartReceiver(field_name, max_files, max_file_size, max_total_size)
+    parser = MultipartParser(boundary, receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except ValueError as e:
+        # python-multipart reports malformed bodies as ValueError subclasses
+        raise UploadRejected(messages.INVALID_MULTIPART_BODY) from e
+    if not receiver.files:
+        raise UploadRejected(messages.NO_FILE_UPLOADED)
+    return receiver.files